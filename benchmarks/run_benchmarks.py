@@ -0,0 +1,278 @@
+"""
+run_benchmarks.py
+
+Time generate-review (`generate_review`) and ai_review_summary.py
+(`generate_summary`) on a synthetic repository and check their output
+against recorded golden files.
+
+Every scenario runs in its own child process, so peak RSS and subprocess
+counts are per scenario. Scenarios that exercise an optimized path (a warm
+cache, an incremental rerun, a threaded review, serial analyzers) must produce exactly the
+same bytes as the plain run; all of them are compared to one golden file
+per entry point, recorded with --record in the style of testoutput.md.
+
+Usage:
+  python benchmarks/run_benchmarks.py [--files N ...] [--record] [--json out.json]
+"""
+import argparse
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from synth_repo import RepoSpec, build_repo
+
+ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+CONTEXT = "Synthetic benchmark change set.\n"
+
+# Functions timed as stages, per entry point (module, attribute)
+REVIEW_STAGES = [
+    ("cli", "build_commit_index"),
+    ("cli", "blob_index"),
+    ("cli", "classify"),
+    ("cli", "run_lint_stage"),
+    ("cli", "run_git"),
+    ("cli", "iter_diff"),
+    ("cli", "render_file_section"),
+]
+SUMMARY_STAGES = [
+    ("summary", "classify"),
+    ("summary", "project_tree"),
+    ("summary", "build_commit_index"),
+    ("summary", "iter_diff"),
+    ("summary", "run_lint_stage"),
+    ("summary", "run_file_sections"),
+]
+
+def load_summary_module():
+    path = ROOT / "combined_solutions" / "ai_review_summary.py"
+    spec = importlib.util.spec_from_file_location("ai_review_summary", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def timed(fn, stages):
+    """
+    Wrap fn so its inclusive wall time accumulates in stages[fn.__name__].
+    Generators are timed while they are consumed, coroutines while awaited.
+    """
+    name = fn.__name__
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                stages[name] += time.perf_counter() - start
+        return wrapper
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            gen = fn(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    stages[name] += time.perf_counter() - start
+                yield item
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stages[name] += time.perf_counter() - start
+    return wrapper
+
+def count_subprocesses():
+    """
+    Count every subprocess.Popen from here on; asyncio subprocesses and
+    subprocess.run go through it too. Returns a one-item list used as a counter.
+    """
+    counter = [0]
+    original = subprocess.Popen.__init__
+
+    def init(self, *args, **kwargs):
+        counter[0] += 1
+        original(self, *args, **kwargs)
+    subprocess.Popen.__init__ = init
+    return counter
+
+def run_scenario(name, repo, out_file, work, conn):
+    """
+    Child process body: set up probes, run one scenario and send its metrics.
+    """
+    from git_ai_review import cli
+    from git_ai_review.async_runner import AsyncToolRunner
+    from git_ai_review.cache import ResultCache
+
+    summary = load_summary_module()
+    modules = {"cli": cli, "summary": summary}
+    stages = defaultdict(float)
+    ctx = work / "context.txt"
+
+    def review(**kwargs):
+        cli.generate_review(ctx, None, str(out_file), "main", "feature", repo, **kwargs)
+
+    def summarize(**kwargs):
+        summary.generate_summary(
+            "main", "feature", repo, ctx, None, str(out_file),
+            {"py", "js", "cs", "dart"}, **kwargs
+        )
+
+    # Warm-up runs are not measured; they prepare the state the measured
+    # run is meant to take advantage of
+    cache = ResultCache(work / f"cache-{name}")
+    scenarios = {
+        "review": (None, lambda: review()),
+        "review-cached": (lambda: review(cache=cache), lambda: review(cache=cache)),
+        "review-incremental": (lambda: review(incremental=True), lambda: review(incremental=True)),
+        "review-jobs": (None, lambda: review(jobs=4)),
+        "summary": (None, lambda: summarize(runner=AsyncToolRunner())),
+        "summary-serial": (None, lambda: summarize(runner=AsyncToolRunner(1))),
+        "summary-cached": (
+            lambda: summarize(cache=cache, runner=AsyncToolRunner()),
+            lambda: summarize(cache=cache, runner=AsyncToolRunner()),
+        ),
+    }
+    warm, measured = scenarios[name]
+
+    # Progress lines from the tools are not part of the benchmark output
+    sys.stdout = open(work / f"{name}.log", "w")
+    if warm:
+        warm()
+    for module, attr in REVIEW_STAGES + SUMMARY_STAGES:
+        setattr(modules[module], attr, timed(getattr(modules[module], attr), stages))
+    spawned = count_subprocesses()
+    start = time.perf_counter()
+    measured()
+    elapsed = time.perf_counter() - start
+    sys.stdout.close()
+
+    data = out_file.read_bytes()
+    conn.send({
+        "scenario": name,
+        "seconds": round(elapsed, 4),
+        "stages": {k: round(v, 4) for k, v in sorted(stages.items())},
+        "subprocesses": spawned[0],
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "output_bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    })
+    conn.close()
+
+def measure(name, repo, work):
+    out_file = work / f"{name}.md"
+    parent, child = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.Process(target=run_scenario, args=(name, repo, out_file, work, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = None
+    proc.join()
+    if result is None or proc.exitcode != 0:
+        sys.exit(f"Scenario {name} failed (exit code {proc.exitcode}); see {work / (name + '.log')}")
+    result["output"] = out_file
+    return result
+
+def golden_path(golden_dir, entry, spec):
+    return golden_dir / f"{entry}-{spec.slug()}.md"
+
+def report(results):
+    print(f"{'scenario':<20} {'seconds':>8} {'procs':>6} {'rss MB':>7} {'bytes':>9}  golden")
+    for r in results:
+        print(
+            f"{r['scenario']:<20} {r['seconds']:>8.3f} {r['subprocesses']:>6} "
+            f"{r['peak_rss_kb'] / 1024:>7.1f} {r['output_bytes']:>9}  {r['golden']}"
+        )
+        for stage, seconds in r["stages"].items():
+            print(f"  {stage:<26} {seconds:>8.3f}")
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark generate_review and generate_summary on a synthetic repository")
+    p.add_argument("--files", type=int, default=RepoSpec.files)
+    p.add_argument("--commits", type=int, default=RepoSpec.commits)
+    p.add_argument("--hunks", type=int, default=RepoSpec.hunks, help="Functions edited per touched file per commit")
+    p.add_argument("--languages", default=RepoSpec.languages, help="Language mix as lang=weight,... (py, js, cs, dart)")
+    p.add_argument("--min-lines", type=int, default=RepoSpec.min_lines)
+    p.add_argument("--max-lines", type=int, default=RepoSpec.max_lines)
+    p.add_argument("--touched", type=float, default=RepoSpec.touched, help="Fraction of files changed over the whole branch")
+    p.add_argument("--seed", type=int, default=RepoSpec.seed)
+    p.add_argument(
+        "--scenario", action="append",
+        choices=[
+            "review", "review-cached", "review-incremental", "review-jobs",
+            "summary", "summary-serial", "summary-cached",
+        ],
+        help="Scenario to run (repeatable; default: all)"
+    )
+    p.add_argument("--golden-dir", type=Path, default=GOLDEN_DIR, help="Directory of recorded golden outputs")
+    p.add_argument("--record", action="store_true", help="Record the plain runs' output as the new golden files")
+    p.add_argument("--json", type=Path, help="Also write the results as JSON to this file")
+    p.add_argument("--keep", action="store_true", help="Keep the synthetic repository and outputs")
+    a = p.parse_args()
+
+    spec = RepoSpec(a.files, a.commits, a.hunks, a.languages, a.min_lines, a.max_lines, a.touched, a.seed)
+    scenarios = a.scenario or [
+        "review", "review-cached", "review-incremental", "review-jobs",
+        "summary", "summary-serial", "summary-cached",
+    ]
+
+    work = Path(tempfile.mkdtemp(prefix="git-ai-review-bench-"))
+    start = time.perf_counter()
+    repo = build_repo(work / "repo", spec)
+    print(f"Built {spec.slug()} in {time.perf_counter() - start:.2f}s at {repo}")
+    (work / "context.txt").write_text(CONTEXT, encoding="utf-8")
+
+    results, failed = [], False
+    for name in scenarios:
+        r = measure(name, repo, work)
+        entry = name.split("-", 1)[0]
+        golden = golden_path(a.golden_dir, entry, spec)
+        if a.record and name == entry:
+            golden.parent.mkdir(parents=True, exist_ok=True)
+            golden.write_bytes(r["output"].read_bytes())
+            r["golden"] = "recorded"
+        elif not golden.is_file():
+            r["golden"] = "missing"
+        elif golden.read_bytes() == r["output"].read_bytes():
+            r["golden"] = "ok"
+        else:
+            r["golden"] = "DIFFERS"
+            failed = True
+        results.append(r)
+
+    report(results)
+    if a.json:
+        a.json.write_text(json.dumps(
+            {"spec": spec.slug(), "results": [{k: v for k, v in r.items() if k != "output"} for r in results]},
+            indent=2
+        ))
+    if a.keep:
+        print(f"Kept {work}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    if failed:
+        sys.exit("Output differs from the golden file")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+synth_repo.py
+
+Build throwaway Git repositories with a configurable shape for benchmarking
+generate-review and ai_review_summary.py. The repository is generated with
+`git fast-import`, and every name, date and edit comes from a seeded RNG, so
+the same parameters always give the same commit SHAs and the same review.
+
+Usage:
+  python benchmarks/synth_repo.py <dest> [--files N] [--commits N] ...
+"""
+import argparse
+import random
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+
+# One top-level function per language, in a shape git's default funcname
+# heuristic (and --function-context) recognises: (head, body line, tail,
+# separator). Python output is flake8-clean so golden files do not depend
+# on which linters are installed.
+TEMPLATES = {
+    "py": ("def {name}(x):\n", "    y = x + {n}\n", "    return y\n", "\n\n"),
+    "js": ("function {name}(x) {{\n", "  const y = x + {n};\n", "  return y;\n}}\n", "\n"),
+    "cs": ("public static int {name}(int x)\n{{\n", "    var y = x + {n};\n", "    return y;\n}}\n", "\n"),
+    "dart": ("int {name}(int x) {{\n", "  final y = x + {n};\n", "  return y;\n}}\n", "\n"),
+}
+DIRS = ["app", "core", "lib", "web", "tests", "tools"]
+AUTHORS = ["Ada Lovelace", "Grace Hopper", "Alan Turing", "Edsger Dijkstra"]
+EPOCH = 1_700_000_000
+
+@dataclass
+class RepoSpec:
+    files: int = 50
+    commits: int = 10
+    hunks: int = 3
+    languages: str = "py=4,js=2,cs=2,dart=1"
+    min_lines: int = 40
+    max_lines: int = 400
+    touched: float = 0.3
+    seed: int = 1
+
+    def language_weights(self):
+        weights = {}
+        for spec in self.languages.split(","):
+            lang, _, w = spec.partition("=")
+            weights[lang.strip()] = float(w or 1)
+        return weights
+
+    def slug(self):
+        return (
+            f"f{self.files}-c{self.commits}-h{self.hunks}-{self.languages.replace(',', '_').replace('=', '')}"
+            f"-l{self.min_lines}_{self.max_lines}-t{self.touched}-s{self.seed}"
+        )
+
+def _render(lang, functions):
+    head, body, tail, sep = TEMPLATES[lang]
+    return sep.join(
+        head.format(name=name) + "".join(body.format(n=v) for v in values) + tail.format()
+        for name, values in functions
+    )
+
+def _new_file(rng, lang, index, spec):
+    lines = rng.randint(spec.min_lines, spec.max_lines)
+    functions, used = [], 0
+    while used < lines:
+        size = rng.randint(3, 12)
+        functions.append((f"func_{index}_{len(functions)}", [rng.randint(0, 999) for _ in range(size)]))
+        used += size + 3
+    return functions
+
+def _edit(rng, functions, hunks, tag):
+    """
+    Change `hunks` randomly chosen functions: tweak, add or drop body lines.
+    """
+    for i in rng.sample(range(len(functions)), min(hunks, len(functions))):
+        name, values = functions[i]
+        values = list(values)
+        op = rng.random()
+        if op < 0.5 and values:
+            values[rng.randrange(len(values))] = rng.randint(1000, 9999)
+        elif op < 0.8:
+            values.insert(rng.randrange(len(values) + 1), rng.randint(1000, 9999))
+        elif len(values) > 1:
+            del values[rng.randrange(len(values))]
+        functions[i] = (name, values)
+    if rng.random() < 0.2:
+        functions.append((f"added_{tag}_{len(functions)}", [rng.randint(0, 99)]))
+
+def _data(text):
+    raw = text.encode("utf-8")
+    return b"data %d\n" % len(raw) + raw + b"\n"
+
+def build_repo(dest, spec=RepoSpec()):
+    """
+    Create a repository at dest with branches `main` (the base) and
+    `feature` (spec.commits commits on top), plus an `origin` remote.
+    Returns the repository path.
+    """
+    rng = random.Random(spec.seed)
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q", "-b", "main", str(dest)], check=True)
+    subprocess.run(
+        ["git", "remote", "add", "origin", "git@example.com:bench/synthetic.git"],
+        cwd=dest, check=True
+    )
+
+    weights = spec.language_weights()
+    langs = list(weights)
+    files = {}
+    for i in range(spec.files):
+        lang = rng.choices(langs, [weights[l] for l in langs])[0]
+        path = f"{rng.choice(DIRS)}/m{i:05d}.{lang}"
+        files[path] = (lang, _new_file(rng, lang, i, spec))
+
+    stream = []
+    mark = 0
+
+    def commit(branch, message, author, paths, parent_mark):
+        nonlocal mark
+        mark += 1
+        when = EPOCH + mark * 60
+        email = author.lower().replace(" ", ".") + "@example.com"
+        stream.append(f"commit refs/heads/{branch}\nmark :{mark}\n".encode())
+        stream.append(f"author {author} <{email}> {when} +0000\n".encode())
+        stream.append(f"committer {author} <{email}> {when} +0000\n".encode())
+        stream.append(_data(message))
+        if parent_mark:
+            stream.append(f"from :{parent_mark}\n".encode())
+        for path in paths:
+            lang, functions = files[path]
+            stream.append(f"M 100644 inline {path}\n".encode())
+            stream.append(_data(_render(lang, functions)))
+        return mark
+
+    base = commit("main", "Initial import", AUTHORS[0], sorted(files), None)
+    head = base
+    paths = sorted(files)
+    for c in range(spec.commits):
+        touched = rng.sample(paths, max(1, int(len(paths) * spec.touched / max(spec.commits, 1))))
+        for path in touched:
+            _edit(rng, files[path][1], spec.hunks, c)
+        head = commit(
+            "feature", f"Change {len(touched)} files (step {c + 1})",
+            AUTHORS[c % len(AUTHORS)], sorted(touched), head
+        )
+    stream.append(b"done\n")
+
+    subprocess.run(
+        ["git", "fast-import", "--quiet", "--done"],
+        cwd=dest, input=b"".join(stream), check=True
+    )
+    subprocess.run(["git", "checkout", "-q", "main"], cwd=dest, check=True)
+    return dest
+
+def main():
+    p = argparse.ArgumentParser(description="Generate a synthetic Git repository for benchmarks")
+    p.add_argument("dest", help="Directory to create the repository in")
+    p.add_argument("--files", type=int, default=RepoSpec.files)
+    p.add_argument("--commits", type=int, default=RepoSpec.commits)
+    p.add_argument("--hunks", type=int, default=RepoSpec.hunks, help="Functions edited per touched file per commit")
+    p.add_argument("--languages", default=RepoSpec.languages, help="Language mix as lang=weight,... (py, js, cs, dart)")
+    p.add_argument("--min-lines", type=int, default=RepoSpec.min_lines)
+    p.add_argument("--max-lines", type=int, default=RepoSpec.max_lines)
+    p.add_argument("--touched", type=float, default=RepoSpec.touched, help="Fraction of files changed over the whole branch")
+    p.add_argument("--seed", type=int, default=RepoSpec.seed)
+    a = p.parse_args()
+    spec = RepoSpec(a.files, a.commits, a.hunks, a.languages, a.min_lines, a.max_lines, a.touched, a.seed)
+    print(build_repo(a.dest, spec))
+
+if __name__ == '__main__':
+    main()
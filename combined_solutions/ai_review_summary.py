@@ -5,19 +5,36 @@ ai_review_summary.py
 A CLI tool to generate AI-friendly code review summaries by combining advanced
 analysis features from multiple implementations.
 Supports generic languages (Python, JavaScript, Dart, C#) with optional
-AST-based semantic diffs, call graphs, and code metrics via external tools.
+AST-based semantic diffs and call graphs (built in for Python), and a table of
+code metrics computed in-process for every changed source file.
 Only executes language-specific steps when enabled via the `--languages` flag.
-Project structure now lists only files not excluded by .gitignore (tracked files).
+Project structure lists the files tracked at the destination ref (via `git ls-tree`).
 """
 import argparse
+import asyncio
 import os
-import subprocess
 import sys
 import json
 from pathlib import Path
 from collections import defaultdict
 import shutil
 
+from git_ai_review.git_objects import GitObjects, GitObjectError
+from git_ai_review.diff_engine import DEFAULT_MAX_PATCH_BYTES, OrderedPatches, blob_index, iter_diff
+from git_ai_review.metrics import DEFAULT_POPULATION, metrics_table
+from git_ai_review.classify import DEFAULT_MAX_BYTES, DEFAULT_MAX_LINES, ClassifyRules, classify
+from git_ai_review.commit_index import build_commit_index
+from git_ai_review.lint import run_lint_stage
+from git_ai_review.snapshot import Snapshot
+from git_ai_review.cache import BUILTIN_TOOLS, ResultCache, file_blob_sha
+from git_ai_review.chunker import DEFAULT_CHUNK_TOKENS, chunk_patch
+from git_ai_review.async_runner import AsyncToolRunner, parse_tool_limits, tool_limit
+from git_ai_review.profiler import span, start_profiling, stop_profiling
+from git_ai_review.deadline import Deadline, ToolSkipped
+from git_ai_review.project_tree import DEFAULT_FOLD_ABOVE, DEFAULT_MAX_DEPTH, project_tree
+from git_ai_review.stream import OutputStream
+from git_ai_review import py_callgraph, py_semantic
+
 # --- Helpers ---
 
 def must_exist_file(p):
@@ -34,62 +51,206 @@ def must_be_repo(p):
     return p
 
 
-def run_cmd(cmd, cwd=None):
-    try:
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT, cwd=cwd)
-        return output.decode('utf-8', errors='replace')
-    except subprocess.CalledProcessError:
+def run_cmd(cmd, cwd=None, timeout=None):
+    with span('cmd', os.path.basename(cmd[0]), cmd=cmd) as s:
+        with OutputStream(cmd, cwd=cwd, timeout=timeout, merge_stderr=True) as proc:
+            output = proc.read()
+        if proc.timed_out:
+            s.update(error='timeout')
+            return None
+        s.update(bytes_out=proc.bytes_read, exit_code=proc.returncode)
+        return output if proc.returncode == 0 else None
+
+
+async def semantic_diff(runner, file_path, branch1, branch2, ext_lang):
+    if not ext_lang or not shutil.which('diffsitter'):
         return None
+    return await runner.run(["diffsitter", "diff", f"--lang={ext_lang}", branch1, branch2, "--", file_path], file=file_path, stage='semantic-diff')
+
 
+async def python_semantic_diff(runner, objects, file_path, pair):
+    """
+    Semantic diff of a Python file's two blobs, computed in-process.
+    """
+    if runner.deadline:
+        runner.deadline.check('semantic-diff')
+    old, new = (objects.blob(sha) if sha != "0" * 40 else b'' for sha in pair)
+    with span('engine', py_semantic.ENGINE, file=file_path):
+        return await asyncio.to_thread(py_semantic.semantic_diff, old, new)
 
 
-def chunk_diff(diff_text, max_chars=5000):
-    return [diff_text[i:i+max_chars] for i in range(0, len(diff_text), max_chars)]
+async def python_call_graph(runner, objects, cache, ref, repo, paths):
+    """
+    One call graph for all changed Python files and their direct importers,
+    computed in-process.
+    """
+    if runner.deadline:
+        runner.deadline.check('call-graph')
+    with span('engine', py_callgraph.ENGINE, files=len(paths)):
+        return await asyncio.to_thread(py_callgraph.build_call_graph, objects, ref, paths, repo, cache)
 
 
-def dump_project_tree(root):
+async def python_call_graph_section(graph, f, patch):
     """
-    Build a directory tree from `git ls-files` (only tracked/unignored files).
+    The part of the shared call graph that touches f's changed functions.
     """
-    files_out = run_cmd(["git", "ls-files"], cwd=root)
-    if not files_out:
-        return "```\n(empty or no tracked files)\n```"
-    files = files_out.splitlines()
-    tree = defaultdict(list)
-    for f in files:
-        parts = f.split('/')
-        if len(parts) == 1:
-            tree['.'].append(parts[0])
-        else:
-            tree[parts[0]].append('/'.join(parts[1:]))
-    lines = ['```']
-    for dir_, subfiles in sorted(tree.items()):
-        lines.append(f"{dir_}/")
-        for sf in sorted(subfiles):
-            lines.append(f"  {sf}")
-    lines.append('```')
-    return '\n'.join(lines)
-
-
-def semantic_diff(file_path, branch1, branch2, ext_lang):
-    if not ext_lang or not shutil.which('diffsitter'):
-        return None
-    return run_cmd(["diffsitter", "diff", f"--lang={ext_lang}", branch1, branch2, "--", file_path])
+    try:
+        return (await graph).section(f, py_callgraph.changed_lines(patch))
+    except ToolSkipped as e:
+        return e
 
 
-def generate_call_graph(file_path, ext_lang):
+async def generate_call_graph(runner, file_path, ext_lang):
     if not ext_lang or not shutil.which('callgraph-gen'):
         return None
-    return run_cmd(["callgraph-gen", f"--lang={ext_lang}", file_path])
+    return await runner.run(["callgraph-gen", f"--lang={ext_lang}", file_path], file=file_path, stage='call-graph')
 
 
-def generate_metrics(file_path, ext_lang):
-    if not ext_lang or not shutil.which('metrics-cli'):
-        return None
-    return run_cmd(["metrics-cli", f"--lang={ext_lang}", file_path, "--format=json"])
+async def cached_call(cache, tool, blobs, compute, config=''):
+    """
+    Await compute() through the result cache when caching is on and the tool is
+    installed (or built in). A ToolSkipped (deadline or timeout) is returned
+    instead of raised, and never cached.
+    """
+    try:
+        if cache is None or (tool not in BUILTIN_TOOLS and not shutil.which(tool)):
+            return await compute()
+        return await cache.acached(tool, blobs, compute, config)
+    except ToolSkipped as e:
+        return e
+
+
+def ext_lang_of(f):
+    ext = Path(f).suffix.lower()
+    if ext == '.cs':
+        return 'csharp'
+    if ext == '.dart':
+        return 'dart'
+    return None
+
+
+async def analyze_file(runner, cache, objects, f, pair, blob, branch1, branch2, langs):
+    """
+    Run the analyzers for one file; returns (semantic diff, call graph).
+    Python files get the built-in AST diff instead of diffsitter; their
+    slice of the shared Python call graph is taken when the section is
+    written, once the file's patch has been read.
+    """
+    ext_lang = ext_lang_of(f)
+    if f.endswith('.py') and 'py' in langs:
+        sem = await cached_call(
+            cache, py_semantic.ENGINE, pair,
+            lambda: python_semantic_diff(runner, objects, f, pair)
+        )
+        return sem, None
+    sem = cached_call(
+        cache, 'diffsitter', pair,
+        lambda: semantic_diff(runner, f, branch1, branch2, ext_lang), ext_lang or ''
+    )
+    if not ext_lang:
+        return await sem, None
+    cg = cached_call(
+        cache, 'callgraph-gen', blob,
+        lambda: generate_call_graph(runner, f, ext_lang), ext_lang
+    )
+    return await asyncio.gather(sem, cg)
+
 
+async def write_file_sections(out, groups, history, lint, patches, analyses, graph, chunk_tokens, classes):
+    """
+    Write the per-file sections in sorted directory/file order while the
+    analyzer tasks for later files keep running. Patches are taken from the
+    streaming diff (an OrderedPatches) as each section is written. Files the
+    classifier skipped get their stat line only.
+    """
+    out.write("## File Changes with Details\n")
+    for grp in sorted(groups):
+        out.write(f"### Directory: {grp}\n")
+        for f in sorted(groups[grp]):
+            if f in classes.skipped:
+                out.write(f"#### File: {f}\n{classes.stat_line(f)}\n\n")
+                continue
+            patch = patches.take(f)
+            sem, cg = await analyses[f]
+            if graph and f.endswith('.py'):
+                cg = await python_call_graph_section(graph, f, patch)
+            with span('render', 'section', file=f):
+                write_file_section(out, f, history, lint, patch, sem, cg, chunk_tokens)
+
+
+def write_file_section(out, f, history, lint, patch, sem, cg, chunk_tokens):
+    """
+    Write one file's summary, lint warnings, chunked diff and analyzer output.
+    Analyzers that were skipped (ToolSkipped) are marked as such.
+    """
+    out.write(f"#### File: {f}\n")
+    # Commit summary
+    summary = history.history(f).latest_subject
+    out.write(f"*Summary:* {summary}\n\n")
+
+    # Linters
+    linted = lint.for_file(f)
+    if linted:
+        label, warnings = linted
+        lint_text = "".join(w + "\n" for w in warnings)
+        out.write(f"**{label}:**\n```\n{lint_text}```\n")
+
+    # Diffs
+    chunks = chunk_patch(patch, chunk_tokens) if patch else []
+    if isinstance(sem, ToolSkipped):
+        out.write(f"**Semantic AST Diff:** _skipped ({sem})_\n")
+    elif sem:
+        out.write(f"**Semantic AST Diff:**\n```\n{sem}```\n")
+    out.write("**Raw Diff (chunked):**\n")
+    for i, c in enumerate(chunks, 1):
+        out.write(f"_Chunk {i}_\n```\n{c}\n```\n")
+
+    # Advanced
+    if isinstance(cg, ToolSkipped):
+        out.write(f"**Call Graph:** _skipped ({cg})_\n")
+    elif cg:
+        out.write(f"**Call Graph:**\n```json\n{cg}```\n")
+    out.write("\n")
+
+
+async def run_file_sections(out, groups, history, lint, patches, changes, objects, cache, runner,
+                            branch1, branch2, repo, chunk_tokens, classes, langs):
+    # Start every reviewed file's analyzers up front; the runner's limits
+    # bound how many actually run at once. Python files share one call graph.
+    py_files = [f for f in changes if f.endswith('.py') and f not in classes.skipped]
+    graph = None
+    if 'py' in langs and py_files:
+        graph = asyncio.ensure_future(python_call_graph(runner, objects, cache, branch2, repo, py_files))
+    analyses = {}
+    for grp in sorted(groups):
+        for f in sorted(groups[grp]):
+            if f in classes.skipped:
+                continue
+            # The old side of a renamed file is its blob under the old path
+            pair = (changes[f].old_sha, changes[f].new_sha)
+            blob = (file_blob_sha(repo / f),)
+            analyses[f] = asyncio.ensure_future(
+                analyze_file(runner, cache, objects, f, pair, blob, branch1, branch2, langs)
+            )
+    try:
+        await write_file_sections(out, groups, history, lint, patches, analyses, graph, chunk_tokens, classes)
+    finally:
+        patches.close()
+        for task in analyses.values():
+            task.cancel()
+        if graph:
+            graph.cancel()
+
+
+def generate_summary(branch1, branch2, repo_path, context_file, task_file, output_file, langs, snapshot=False, cache=None,
+                     chunk_tokens=DEFAULT_CHUNK_TOKENS, runner=None, deadline=None,
+                     tree_depth=DEFAULT_MAX_DEPTH, tree_fold=DEFAULT_FOLD_ABOVE, tree_changed_only=False,
+                     rules=None, metrics_population=DEFAULT_POPULATION, max_patch_bytes=DEFAULT_MAX_PATCH_BYTES):
+    # Per-tool timeouts and the run's time budget; by default tools are only
+    # bounded by their own timeouts
+    deadline = deadline or Deadline()
+    git_timeout = deadline.timeout_for('git')
 
-def generate_summary(branch1, branch2, repo_path, context_file, task_file, output_file, langs):
     # Prepare absolute output path
     output_path = Path(output_file).expanduser().resolve()
     repo = Path(repo_path).expanduser().resolve()
@@ -106,10 +267,15 @@ def generate_summary(branch1, branch2, repo_path, context_file, task_file, outpu
         'js': 'js' in langs
     }
 
-    # Validate branches
+    # Validate branches and pin them to commits for the rest of the run
+    objects = GitObjects(repo)
+    resolved = []
     for ref in (branch1, branch2):
-        if not run_cmd(["git", "rev-parse", "--verify", ref], cwd=repo):
+        try:
+            resolved.append(objects.resolve(ref))
+        except GitObjectError:
             sys.exit(f"Branch or ref not found: {ref}")
+    branch1, branch2 = resolved
 
     # Open output file
     try:
@@ -127,90 +293,83 @@ def generate_summary(branch1, branch2, repo_path, context_file, task_file, outpu
         out.write(task_text)
         out.write("```\n\n")
 
-    # Project Tree
+    # Classify the changed files from numstat and .gitattributes; binary,
+    # generated, vendored and oversized ones only get a stat line
+    changes = blob_index(branch1, branch2, repo)
+    classes = classify(branch1, branch2, changes, repo, rules, objects)
+    reviewed = [f for f in changes if f not in classes.skipped]
+    if classes.skipped:
+        print(f"Skipped {len(classes.skipped)} binary, generated, vendored or oversized files")
+
+    # File changes: one streamed diff for the reviewed files, read file by
+    # file as the sections are written and capped at max_patch_bytes each
+    # (both sides of a rename keep it detected)
+    paths = None
+    if classes.skipped:
+        paths = [changes[f] for f in reviewed]
+    patches = OrderedPatches(iter_diff(branch1, branch2, repo, diff_args=("-U3",), paths=paths, max_bytes=max_patch_bytes))
+
+    # Project Tree: the files tracked at branch2, cached by its tree SHA
     out.write("## Project Structure (tracked files)\n")
-    out.write(dump_project_tree(str(repo)))
+    out.write(project_tree(
+        branch2, repo, tree_depth, tree_fold,
+        changed=list(changes) if tree_changed_only else None,
+        cache=cache, tree_sha=objects.info(f"{branch2}^{{tree}}")[0], timeout=git_timeout
+    ))
     out.write("\n\n")
 
     # Change summary
-    shortstat = run_cmd(["git", "diff", "--shortstat", branch1, branch2], cwd=repo) or ''
+    shortstat = run_cmd(["git", "diff", "--shortstat", branch1, branch2], cwd=repo, timeout=git_timeout) or ''
     out.write(f"## Change Summary\n{shortstat}\n\n")
 
     # Commits
-    commits = run_cmd(["git", "log", f"{branch1}..{branch2}", "--pretty=format:%h|%an|%s"], cwd=repo) or ''
+    history = build_commit_index(branch1, branch2, repo)
     out.write("## Commits\n")
-    for line in commits.splitlines():
-        h, a, s = line.split('|', 2)
-        out.write(f"- **{h}** by {a}: {s}\n")
+    for c in history.commits:
+        out.write(f"- **{c.short}** by {c.author}: {c.subject}\n")
     out.write("\n")
 
-    # File changes details
-    files = run_cmd(["git", "diff", "--name-only", branch1, branch2], cwd=repo) or ''
+    # Code metrics: both sides of every changed source file, measured
+    # in-process and compared in one table
+    if deadline.allows('metrics'):
+        table = metrics_table(
+            objects, [changes[f] for f in reviewed], branch2, repo, cache, langs, metrics_population
+        )
+        if table:
+            out.write(f"## Code Metrics\n{table.render()}\n")
+    else:
+        out.write("## Code Metrics\n_skipped (deadline reached)_\n\n")
+
+    # File changes details, grouped by top-level directory
     groups = defaultdict(list)
-    for f in files.splitlines():
+    for f in changes:
         key = f.split('/', 1)[0] if '/' in f else '.'
         groups[key].append(f)
 
-    out.write("## File Changes with Details\n")
-    for grp in sorted(groups):
-        out.write(f"### Directory: {grp}\n")
-        for f in sorted(groups[grp]):
-            out.write(f"#### File: {f}\n")
-            # Commit summary
-            msgs = run_cmd([
-                "git", "log", "--pretty=format:%s", f"{branch1}..{branch2}", "--", f
-            ], cwd=repo) or ''
-            summary = msgs.splitlines()[0] if msgs else 'No commits'
-            out.write(f"*Summary:* {summary}\n\n")
-
-            path = repo / f
-            ext = path.suffix.lower()
-            code_key = None
-            ext_lang = None
-            if ext == '.cs':
-                code_key, ext_lang = 'cs', 'csharp'
-            elif ext == '.dart':
-                code_key, ext_lang = 'dart', 'dart'
-            elif ext == '.py':
-                code_key = 'py'
-            elif ext in ('.js', '.jsx'):
-                code_key = 'js'
-
-            # Linters
-            if code_key == 'py' and shutil.which('flake8'):
-                lint = run_cmd(['flake8', str(path)]) or ''
-                out.write(f"**Flake8 warnings:**\n```\n{lint}```\n")
-            if code_key == 'js' and shutil.which('eslint'):
-                lint = run_cmd(['eslint', '--quiet', '--format', 'unix', str(path)]) or ''
-                out.write(f"**ESLint warnings:**\n```\n{lint}```\n")
-            if code_key == 'dart' and shutil.which('dart'):
-                lint = run_cmd(['dart', 'analyze', str(path)]) or ''
-                out.write(f"**Dart analyzer warnings:**\n```\n{lint}```\n")
-            if code_key == 'cs' and shutil.which('dotnet'):
-                lint = run_cmd(['dotnet', 'format', '--verify-no-changes', '--include', str(path)]) or ''
-                out.write(f"**C# format check:**\n```\n{lint}```\n")
-
-            # Diffs
-            sem = semantic_diff(f, branch1, branch2, ext_lang)
-            raw = run_cmd(["git", "diff", "-U3", branch1, branch2, "--", f], cwd=repo) or ''
-            chunks = chunk_diff(raw)
-            if sem:
-                out.write(f"**Semantic AST Diff:**\n```\n{sem}```\n")
-            out.write("**Raw Diff (chunked):**\n")
-            for i, c in enumerate(chunks, 1):
-                out.write(f"_Chunk {i}_\n```\n{c}\n```\n")
-
-            # Advanced
-            if ext_lang:
-                cg = generate_call_graph(f, ext_lang)
-                if cg:
-                    out.write(f"**Call Graph:**\n```json\n{cg}```\n")
-                met = generate_metrics(f, ext_lang)
-                if met:
-                    out.write(f"**Code Metrics:**\n```json\n{met}```\n")
-            out.write("\n")
+    # Linters: one run per tool over every changed file, optionally on a
+    # snapshot of branch2 rather than the working tree
+    if snapshot:
+        with Snapshot(objects, branch2, reviewed) as snap:
+            lint = run_lint_stage(reviewed, snap.root, cache=cache, deadline=deadline)
+    else:
+        lint = run_lint_stage(reviewed, repo, cache=cache, deadline=deadline)
+    for tool, seconds in lint.timings.items():
+        print(f"Lint {tool}: {seconds:.2f}s")
+    if lint.skipped:
+        print(f"Lint skipped for {len(lint.skipped)} files (deadline or timeout)")
+
+    runner = runner or AsyncToolRunner(deadline=deadline)
+    asyncio.run(run_file_sections(
+        out, groups, history, lint, patches, changes, objects, cache, runner,
+        branch1, branch2, repo, chunk_tokens, classes, langs
+    ))
+    for tool, seconds in runner.timings.items():
+        print(f"{tool}: {seconds:.2f}s total tool time")
 
     out.close()
+    objects.close()
+    if cache is not None:
+        print(f"Cache: {cache.stats()}")
 
 
 def main():
@@ -222,16 +381,57 @@ def main():
     parser.add_argument("-t", "--task-file", type=must_exist_file, help="Task instructions file")
     parser.add_argument("-o", "--output-file", default="review_summary.md", help="Output Markdown file")
     parser.add_argument("-l", "--languages", default="cs,py,js,dart", help="Comma-separated list of languages to include: cs,py,js,dart")
+    parser.add_argument("--snapshot", action="store_true", help="Lint branch2 from a temporary snapshot instead of the working tree")
+    parser.add_argument("--cache-dir", help="Result cache directory (default: ~/.cache/git-ai-review)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the result cache")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Approximate token budget per raw diff chunk")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Maximum external analyzers running at once (default: CPU count)")
+    parser.add_argument("--tool-limit", action="append", type=tool_limit(), metavar="TOOL=N", help="Per-tool concurrency limit, e.g. diffsitter=4 (repeatable)")
+    parser.add_argument("--tree-depth", type=int, default=DEFAULT_MAX_DEPTH, help=f"Directory levels shown in the project tree (default: {DEFAULT_MAX_DEPTH})")
+    parser.add_argument("--tree-fold", type=int, default=DEFAULT_FOLD_ABOVE, help=f"Show directories with more entries than this as a file count (default: {DEFAULT_FOLD_ABOVE})")
+    parser.add_argument("--tree-changed-only", action="store_true", help="Only show the changed files and their parent directories in the project tree")
+    parser.add_argument("--skip-glob", action="append", metavar="GLOB", help="Also give files whose path matches GLOB only a stat line, e.g. 'assets/*' (repeatable)")
+    parser.add_argument("--max-file-lines", type=int, default=DEFAULT_MAX_LINES, help=f"Skip files with more changed lines than this; 0 for no limit (default: {DEFAULT_MAX_LINES})")
+    parser.add_argument("--max-file-bytes", type=int, default=DEFAULT_MAX_BYTES, help=f"Skip files larger than this many bytes; 0 for no limit (default: {DEFAULT_MAX_BYTES})")
+    parser.add_argument("--max-patch-bytes", type=int, default=DEFAULT_MAX_PATCH_BYTES, help=f"Cut each file's diff after this many bytes; 0 for no limit (default: {DEFAULT_MAX_PATCH_BYTES})")
+    parser.add_argument("--no-classify", action="store_true", help="Send every file through lint, diff and the analyzers, including binary, generated and vendored ones")
+    parser.add_argument("--metrics-population", type=int, default=DEFAULT_POPULATION, help=f"Files per language measured at branch2 for the complexity percentiles; 0 to skip them (default: {DEFAULT_POPULATION})")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS", help="Time budget for the whole run; semantic diff, call graph, metrics and lint are skipped (and marked) in that order as it runs low")
+    parser.add_argument("--timeout", action="append", type=tool_limit(float), metavar="TOOL=SECONDS", help="Per-tool timeout override, e.g. diffsitter=30 (repeatable)")
+    parser.add_argument("--profile", metavar="TRACE_JSON", help="Write a Chrome/Perfetto trace of tool, git and linter calls and print the slowest to stderr")
     args = parser.parse_args()
     langs = {l.strip().lower() for l in args.languages.split(',')}
-    generate_summary(
-        args.branch1, args.branch2,
-        args.repo_path,
-        args.context_file,
-        args.task_file,
-        args.output_file,
-        langs
-    )
+    deadline = Deadline(args.deadline, parse_tool_limits(args.timeout, float))
+    if args.profile:
+        # Resolve now: generate_summary changes into the repository
+        trace_file = Path(args.profile).resolve()
+        start_profiling()
+    try:
+        generate_summary(
+            args.branch1, args.branch2,
+            args.repo_path,
+            args.context_file,
+            args.task_file,
+            args.output_file,
+            langs,
+            snapshot=args.snapshot,
+            cache=None if args.no_cache else ResultCache(args.cache_dir),
+            chunk_tokens=args.chunk_tokens,
+            runner=AsyncToolRunner(args.jobs, parse_tool_limits(args.tool_limit), deadline),
+            deadline=deadline,
+            tree_depth=args.tree_depth,
+            tree_fold=args.tree_fold,
+            tree_changed_only=args.tree_changed_only,
+            rules=ClassifyRules(
+                tuple(args.skip_glob or ()), args.max_file_lines or None,
+                args.max_file_bytes or None, not args.no_classify
+            ),
+            metrics_population=args.metrics_population,
+            max_patch_bytes=args.max_patch_bytes or None
+        )
+    finally:
+        if args.profile:
+            stop_profiling(trace_file)
 
 if __name__ == '__main__':
     main()
@@ -6,8 +6,9 @@ A CLI tool to summarize changes between two Git branches with enhanced context f
 Supports C# and Dart/Flutter projects.
 
 Features implemented:
- 1. Project structure tree output
- 2. Dependency graph export (dotnet & dart)
+ 1. Project structure tree output (tracked files at branch2), cached by tree SHA
+ 2. Dependency graphs (dotnet & dart), cached by manifests and lockfiles,
+    shown as the package changes between the branches when both are known
  3. Static analysis summaries (dotnet build warnings & dart analyze)
  4. AST-based semantic diffs (via external `diffsitter` CLI)
  5. Call graph export (via external `callgraph-gen` CLI)
@@ -21,114 +22,159 @@ Run `python compare_branches.py --help` for details.
 """
 import argparse
 import os
-import subprocess
+import shutil
 import sys
-import json
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+from git_ai_review.diff_engine import OrderedPatches, blob_index, iter_diff
+from git_ai_review.chunker import DEFAULT_CHUNK_TOKENS, chunk_patch
+from git_ai_review.profiler import span, start_profiling, stop_profiling
+from git_ai_review.deadline import Deadline, ToolSkipped
+from git_ai_review.async_runner import parse_tool_limits, tool_limit
+from git_ai_review.project_tree import DEFAULT_FOLD_ABOVE, DEFAULT_MAX_DEPTH, project_tree
+from git_ai_review.cache import ResultCache
+from git_ai_review.deps import DART, DOTNET, dependency_graph, diff_graphs, manifest_blobs, manifest_hash, render_graph
+from git_ai_review.stream import OutputStream
+
 # === Helpers ===
 
-def run_cmd(cmd, cwd=None):
+def run_cmd(cmd, cwd=None, deadline=None, stage=None):
     """
     Run shell command and return stdout, exit on error.
+    With a Deadline the command runs under its tool's timeout, and raises
+    ToolSkipped on timeout or when the deadline no longer allows stage.
     """
-    try:
-        out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, text=True, cwd=cwd)
+    tool = os.path.basename(cmd[0])
+    timeout = None
+    if deadline:
+        deadline.check(stage)
+        timeout = deadline.timeout_for(tool)
+    with span("cmd", tool, cmd=cmd) as s:
+        try:
+            proc = OutputStream(cmd, cwd=cwd, timeout=timeout, merge_stderr=True)
+        except FileNotFoundError:
+            s.update(error="not found")
+            print(f"[Error] Command not found: {cmd[0]}", file=sys.stderr)
+            return None
+        with proc:
+            out = proc.read()
+        if proc.timed_out:
+            s.update(error="timeout")
+            print(f"[Error] Command timed out after {timeout:.0f}s: {' '.join(cmd)}", file=sys.stderr)
+            raise ToolSkipped(f"{tool} timed out after {timeout:.0f}s")
+        s.update(bytes_out=proc.bytes_read, exit_code=proc.returncode)
+        if proc.returncode != 0:
+            print(f"[Error] Command failed: {' '.join(cmd)}", file=sys.stderr)
+            print(out, file=sys.stderr)
+            return None
         return out
-    except subprocess.CalledProcessError as e:
-        print(f"[Error] Command failed: {' '.join(cmd)}", file=sys.stderr)
-        print(e.output, file=sys.stderr)
-        return None
-
-# === Feature 1: Project Structure ===
 
-def dump_project_tree(root):
+def skippable(fn, *args):
     """
-    Return a markdown-formatted tree of the project structure.
+    Call fn, returning a ToolSkipped instead of raising it so the output
+    can mark the skipped step.
     """
-    lines = ["```"]
-    for dirpath, dirs, files in os.walk(root):
-        depth = dirpath.replace(root, '').count(os.sep)
-        indent = '  ' * depth
-        lines.append(f"{indent}{os.path.basename(dirpath)}/")
-        for f in files:
-            lines.append(f"{indent}  {f}")
-    lines.append("```")
-    return '\n'.join(lines)
+    try:
+        return fn(*args)
+    except ToolSkipped as e:
+        return e
+
+# === Feature 1: Project Structure ===
+
+# Built from `git ls-tree` at the destination ref by git_ai_review.project_tree.
 
 # === Feature 2: Dependency Graph ===
 
-def dump_dotnet_deps(repo_path):
+def dump_dotnet_deps(repo_path, deadline=None):
     """
     Run `dotnet list package --include-transitive --format json` if available.
     """
-    out = run_cmd(["dotnet", "list", "package", "--include-transitive", "--format", "json"], cwd=repo_path)
-    if not out:
+    if not shutil.which("dotnet"):
         return None
-    data = json.loads(out)
-    return json.dumps(data, indent=2)
+    return run_cmd(["dotnet", "list", "package", "--include-transitive", "--format", "json"], cwd=repo_path, deadline=deadline)
 
-def dump_dart_deps(repo_path):
+def dump_dart_deps(repo_path, deadline=None):
     """
     Run `dart pub deps --style=json` for Dart/Flutter projects.
     """
-    out = run_cmd(["dart", "pub", "deps", "--style=json"], cwd=repo_path)
-    return out
+    if not shutil.which("dart"):
+        return None
+    return run_cmd(["dart", "pub", "deps", "--style=json"], cwd=repo_path, deadline=deadline)
+
+def dependency_section(kind, title, dump, repo, refs, blobs, cache=None, deadline=None):
+    """
+    Markdown for one ecosystem's dependencies: nothing if neither branch has
+    its manifests, the package changes between the branches when both
+    graphs are known (cached, or computed in a working tree at that branch),
+    and otherwise the full graph of branch2.
+    """
+    old_key, new_key = (manifest_hash(blobs[ref], kind) for ref in refs)
+    if old_key is None and new_key is None:
+        return ""
+    if old_key == new_key:
+        return f"### {title}\n_No changes (manifests and lockfiles are the same on both branches)._\n"
+
+    def run():
+        return dump(str(repo), deadline)
+
+    # Whichever branch the working tree is at gets listed (and cached)
+    old = {} if old_key is None else dependency_graph(kind, refs[0], repo, run, blobs[refs[0]], cache)
+    new = {} if new_key is None else dependency_graph(kind, refs[1], repo, run, blobs[refs[1]], cache)
+    if new is None:
+        return f"### {title}\n_Not available (no cached graph for {refs[1]}, and none could be listed from the working tree)._\n"
+    if old is None:
+        return f"### {title}\n```json\n" + render_graph(new) + "```\n"
+    changes = diff_graphs(old, new)
+    if not changes:
+        return f"### {title}\n_No changes in resolved packages._\n"
+    return f"### {title} (changes)\n```diff\n" + changes + "```\n"
 
 # === Feature 3: Static Analysis ===
 
-def dump_dotnet_analysis(repo_path):
+def dump_dotnet_analysis(repo_path, deadline=None):
     """
     Capture warnings/errors from `dotnet build`.
     """
-    out = run_cmd(["dotnet", "build", "-warnaserror:false"], cwd=repo_path)
+    out = run_cmd(["dotnet", "build", "-warnaserror:false"], cwd=repo_path, deadline=deadline, stage="lint")
     return out
 
-def dump_dart_analysis(repo_path):
+def dump_dart_analysis(repo_path, deadline=None):
     """
     Run `dart analyze` and capture issues.
     """
-    out = run_cmd(["dart", "analyze"], cwd=repo_path)
+    out = run_cmd(["dart", "analyze"], cwd=repo_path, deadline=deadline, stage="lint")
     return out
 
 # === Feature 4: Semantic AST Diffs ===
 
-def semantic_diff(file_path, branch1, branch2, lang):
+def semantic_diff(file_path, branch1, branch2, lang, deadline=None):
     """
     Use external `diffsitter` CLI for AST diff. lang: 'csharp' or 'dart'
     """
     cmd = ["diffsitter", "diff", f"--lang={lang}", f"{branch1}", f"{branch2}", "--", file_path]
-    return run_cmd(cmd)
+    return run_cmd(cmd, deadline=deadline, stage="semantic-diff")
 
 # === Feature 5: Call Graphs ===
 
-def generate_call_graph(file_path, lang):
+def generate_call_graph(file_path, lang, deadline=None):
     """
     Use external `callgraph-gen` CLI. lang: 'csharp' or 'dart'
     """
     cmd = ["callgraph-gen", f"--lang={lang}", file_path]
-    return run_cmd(cmd)
+    return run_cmd(cmd, deadline=deadline, stage="call-graph")
 
 # === Feature 6: Code Metrics ===
 
-def generate_metrics(file_path, lang):
+def generate_metrics(file_path, lang, deadline=None):
     """
     Use external `metrics-cli` to compute complexity, etc.
     """
     cmd = ["metrics-cli", f"--lang={lang}", file_path, "--format=json"]
-    return run_cmd(cmd)
+    return run_cmd(cmd, deadline=deadline, stage="metrics")
 
 # === Feature 7: Chunked Diffs ===
-
-def chunk_diff(diff_text, max_chars=5000):
-    """
-    Split diff_text into chunks <= max_chars.
-    """
-    chunks = []
-    for i in range(0, len(diff_text), max_chars):
-        chunks.append(diff_text[i:i+max_chars])
-    return chunks
+# Hunk-aware, token-budgeted chunking lives in git_ai_review.chunker.
 
 # === Main CLI ===
 
@@ -140,10 +186,31 @@ def parse_args():
     p.add_argument("-c", "--context-file", help="Context notes file")
     p.add_argument("-t", "--task-file", help="Task instructions file")
     p.add_argument("-o", "--output", default="changes_summary.md", help="Output Markdown file")
+    p.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Approximate token budget per raw diff chunk")
+    p.add_argument("--tree-depth", type=int, default=DEFAULT_MAX_DEPTH, help=f"Directory levels shown in the project tree (default: {DEFAULT_MAX_DEPTH})")
+    p.add_argument("--tree-fold", type=int, default=DEFAULT_FOLD_ABOVE, help=f"Show directories with more entries than this as a file count (default: {DEFAULT_FOLD_ABOVE})")
+    p.add_argument("--tree-changed-only", action="store_true", help="Only show the changed files and their parent directories in the project tree")
+    p.add_argument("--cache-dir", help="Cache directory for the project tree and dependency graphs (default: ~/.cache/git-ai-review)")
+    p.add_argument("--no-cache", action="store_true", help="Do not read or write cached project trees or dependency graphs")
+    p.add_argument("--deadline", type=float, metavar="SECONDS", help="Time budget for the whole run; semantic diff, call graph, metrics and static analysis are skipped (and marked) in that order as it runs low")
+    p.add_argument("--timeout", action="append", type=tool_limit(float), metavar="TOOL=SECONDS", help="Per-tool timeout override, e.g. dotnet=300 (repeatable)")
+    p.add_argument("--profile", metavar="TRACE_JSON", help="Write a Chrome/Perfetto trace of every command and print the slowest to stderr")
     return p.parse_args()
 
 def main():
     args = parse_args()
+    if args.profile:
+        trace_file = Path(args.profile).resolve()
+        start_profiling()
+        try:
+            summarize(args)
+        finally:
+            stop_profiling(trace_file)
+    else:
+        summarize(args)
+
+def summarize(args):
+    deadline = Deadline(args.deadline, parse_tool_limits(args.timeout, float))
     repo = Path(args.repo_path).resolve()
     os.chdir(repo)
 
@@ -165,39 +232,57 @@ def main():
         out.write("```\n\n")
 
     # --- Project tree ---
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    # Changed files in diff order; their patches stream in as they are written
+    changes = blob_index(args.branch1, args.branch2, repo)
+    patches = OrderedPatches(iter_diff(args.branch1, args.branch2, repo, diff_args=("-U3",)))
     out.write("## Project Structure\n")
-    out.write(dump_project_tree(str(repo)))
+    out.write(project_tree(
+        args.branch2, repo, args.tree_depth, args.tree_fold,
+        changed=list(changes) if args.tree_changed_only else None,
+        cache=cache, timeout=deadline.timeout_for("git")
+    ))
     out.write("\n\n")
 
     # --- Dependencies ---
     out.write("## Dependency Graphs\n")
-    cs_deps = dump_dotnet_deps(str(repo))
-    if cs_deps:
-        out.write("### .NET Packages\n```json\n" + cs_deps + "```\n")
-    dart_deps = dump_dart_deps(str(repo))
-    if dart_deps:
-        out.write("### Dart/Flutter Packages\n```json\n" + dart_deps + "```\n")
+    refs = (args.branch1, args.branch2)
+    blobs = {ref: manifest_blobs(ref, repo) for ref in refs}
+    for kind, title, dump in ((DOTNET, ".NET Packages", dump_dotnet_deps), (DART, "Dart/Flutter Packages", dump_dart_deps)):
+        section = skippable(dependency_section, kind, title, dump, repo, refs, blobs, cache, deadline)
+        if isinstance(section, ToolSkipped):
+            out.write(f"### {title}\n_Skipped ({section})_\n")
+        else:
+            out.write(section)
     out.write("\n")
 
     # --- Static Analysis ---
     out.write("## Static Analysis\n")
-    dotnet_ana = dump_dotnet_analysis(str(repo))
-    if dotnet_ana:
+    dotnet_ana = skippable(dump_dotnet_analysis, str(repo), deadline)
+    if isinstance(dotnet_ana, ToolSkipped):
+        out.write(f"### .NET Build Warnings & Errors\n_Skipped ({dotnet_ana})_\n")
+    elif dotnet_ana:
         out.write("### .NET Build Warnings & Errors\n```")
         out.write(dotnet_ana)
         out.write("```\n")
-    dart_ana = dump_dart_analysis(str(repo))
-    if dart_ana:
+    dart_ana = skippable(dump_dart_analysis, str(repo), deadline)
+    if isinstance(dart_ana, ToolSkipped):
+        out.write(f"### Dart Analyzer Output\n_Skipped ({dart_ana})_\n")
+    elif dart_ana:
         out.write("### Dart Analyzer Output\n```")
         out.write(dart_ana)
         out.write("```\n")
     out.write("\n")
 
     # --- Shortstat & commits ---
-    shortstat = run_cmd(["git", "diff", "--shortstat", args.branch1, args.branch2])
+    shortstat = skippable(run_cmd, ["git", "diff", "--shortstat", args.branch1, args.branch2], None, deadline)
+    if isinstance(shortstat, ToolSkipped):
+        shortstat = f"_Skipped ({shortstat})_"
     out.write("## Summary of Changes\n" + (shortstat or "") + "\n\n")
 
-    commits = run_cmd(["git", "log", f"{args.branch1}..{args.branch2}", "--pretty=format:%h|%an|%s"])
+    commits = skippable(run_cmd, ["git", "log", f"{args.branch1}..{args.branch2}", "--pretty=format:%h|%an|%s"], None, deadline)
+    if isinstance(commits, ToolSkipped):
+        commits = None
     out.write("## Commits\n")
     if commits:
         for line in commits.splitlines():
@@ -209,14 +294,10 @@ def main():
 
     # --- File diffs with enhancements ---
     out.write("## File Changes with Enhanced Context\n")
-    files = run_cmd(["git", "diff", "--name-only", args.branch1, args.branch2]).splitlines()
-    for f in files:
+    for f in changes:
         ext = Path(f).suffix.lower()
         out.write(f"### {f}\n")
 
-        # raw diff
-        raw = run_cmd(["git", "diff", "-U3", args.branch1, args.branch2, "--", f]) or ""
-
         # semantic diff
         sem = None
         lang = None
@@ -225,23 +306,26 @@ def main():
         elif ext == '.dart':
             lang = 'dart'
         if lang:
-            sem = semantic_diff(f, args.branch1, args.branch2, lang)
+            sem = skippable(semantic_diff, f, args.branch1, args.branch2, lang, deadline)
 
         # call graph
         cg = None
         if lang:
-            cg = generate_call_graph(f, lang)
+            cg = skippable(generate_call_graph, f, lang, deadline)
 
         # metrics
         met = None
         if lang:
-            met = generate_metrics(f, lang)
+            met = skippable(generate_metrics, f, lang, deadline)
 
-        # chunk raw diff
-        chunks = chunk_diff(raw)
+        # chunk raw diff on hunk boundaries within the token budget
+        patch = patches.take(f)
+        chunks = chunk_patch(patch, args.chunk_tokens) if patch else []
 
         # write summaries
-        if sem:
+        if isinstance(sem, ToolSkipped):
+            out.write(f"#### Semantic AST Diff\n_Skipped ({sem})_\n")
+        elif sem:
             out.write("#### Semantic AST Diff\n```")
             out.write(sem)
             out.write("```\n")
@@ -251,12 +335,17 @@ def main():
             out.write(c)
             out.write("```\n")
 
-        if cg:
+        if isinstance(cg, ToolSkipped):
+            out.write(f"#### Call Graph\n_Skipped ({cg})_\n")
+        elif cg:
             out.write("#### Call Graph\n```json\n" + cg + "```\n")
-        if met:
+        if isinstance(met, ToolSkipped):
+            out.write(f"#### Code Metrics\n_Skipped ({met})_\n")
+        elif met:
             out.write("#### Code Metrics\n```json\n" + met + "```\n")
         out.write("\n")
 
+    patches.close()
     out.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+from git_ai_review.profiler import span
+from git_ai_review.deadline import ToolSkipped
+
+class AsyncToolRunner:
+    """
+    Run external analyzers concurrently with asyncio subprocesses, bounded by
+    a global limit and optional per-tool limits (e.g. a tool that loads a
+    whole solution may only tolerate one or two copies at a time).
+    An optional Deadline supplies per-tool timeouts and skips stages that
+    can no longer start in time.
+    """
+
+    def __init__(self, max_concurrency=None, per_tool=None, deadline=None):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.per_tool = dict(per_tool or {})
+        self.deadline = deadline
+        self.timings = defaultdict(float)
+        self._global = None
+        self._tools = {}
+        self._lanes = []
+        self._next_lane = 1
+
+    def _semaphores(self, tool):
+        # Semaphores bind to the running loop, so create them lazily
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        if tool not in self._tools:
+            self._tools[tool] = asyncio.Semaphore(self.per_tool.get(tool, self.max_concurrency))
+        return self._global, self._tools[tool]
+
+    def _take_lane(self):
+        # A profiler track per concurrently running tool, reused when free
+        if self._lanes:
+            return self._lanes.pop()
+        self._next_lane += 1
+        return self._next_lane - 1
+
+    async def run(self, cmd, cwd=None, file=None, stage=None):
+        """
+        Run cmd and return its combined stdout/stderr, or None if it failed.
+        Raises ToolSkipped if the deadline no longer allows stage, or if the
+        tool outlives its timeout. file only labels the call in a profile.
+        """
+        tool = os.path.basename(cmd[0])
+        global_sem, tool_sem = self._semaphores(tool)
+        async with tool_sem, global_sem:
+            # Checked once a slot is free: queued work is what gets dropped
+            timeout = None
+            if self.deadline:
+                self.deadline.check(stage)
+                timeout = self.deadline.timeout_for(tool)
+            lane = self._take_lane()
+            try:
+                with span("tool", tool, tid=lane, cmd=cmd, file=file) as s:
+                    start = time.perf_counter()
+                    try:
+                        proc = await asyncio.create_subprocess_exec(
+                            *cmd, cwd=cwd,
+                            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+                        )
+                    except OSError:
+                        return None
+                    try:
+                        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+                    except asyncio.TimeoutError:
+                        proc.kill()
+                        await proc.wait()
+                        s.update(exit_code=proc.returncode, error="timeout")
+                        raise ToolSkipped(f"timed out after {timeout:.0f}s")
+                    finally:
+                        self.timings[tool] += time.perf_counter() - start
+                    s.update(bytes_out=len(out), exit_code=proc.returncode)
+            finally:
+                self._lanes.append(lane)
+        if proc.returncode != 0:
+            return None
+        return out.decode("utf-8", errors="replace")
+
+def parse_tool_limit(spec, cast=int):
+    """
+    Parse "tool=N" into ("tool", cast(N)); N must be a positive number.
+    """
+    tool, sep, n = spec.partition("=")
+    tool = tool.strip()
+    if not sep or not tool:
+        raise ValueError(f"Expected TOOL=N, got {spec!r}")
+    try:
+        value = cast(n)
+    except ValueError:
+        raise ValueError(f"Not a number in {spec!r}") from None
+    if not value > 0:
+        raise ValueError(f"Limit must be positive in {spec!r}")
+    return tool, value
+
+def tool_limit(cast=int):
+    """
+    argparse type for "TOOL=N" options: the spec is checked up front (so a
+    bad one is a usage error) and kept as given for parse_tool_limits.
+    """
+    def check(spec):
+        try:
+            parse_tool_limit(spec, cast)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+        return spec
+    return check
+
+def parse_tool_limits(specs, cast=int):
+    """
+    Parse ["tool=N", ...] into {"tool": cast(N)}; raises ValueError on a
+    malformed spec.
+    """
+    return dict(parse_tool_limit(spec, cast) for spec in specs or ())
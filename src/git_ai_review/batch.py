@@ -0,0 +1,266 @@
+"""
+`generate-review batch`: many reviews of one repository in one invocation.
+
+Each line of the jobs file (or stdin) is one review:
+
+  SRC DST OUTPUT [CONTEXT_FILE]
+
+Blank lines and lines starting with "#" are ignored; fields may be quoted.
+All refs are resolved up front, so every job sees the same snapshot of the
+repository, and the jobs are spread over a process pool. Lint results are
+shared between jobs, and with the rest of the runs on this machine, through
+the result cache. Every destination's changed files are linted before the
+jobs start, so a blob that several branches have in common is linted once
+even when the jobs that review it run at the same time.
+"""
+import argparse
+import contextlib
+import os
+import shlex
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from git_ai_review.async_runner import parse_tool_limits, tool_limit
+from git_ai_review.cache import ResultCache
+from git_ai_review.classify import classify
+from git_ai_review.cli import generate_review
+from git_ai_review.deadline import Deadline
+from git_ai_review.diff_engine import blob_index
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.git_wrapper import must_be_repo, must_exist_file
+from git_ai_review.lint import run_lint_stage
+from git_ai_review.session import RepoSession
+from git_ai_review.snapshot import Snapshot
+
+@dataclass
+class Job:
+    line: int
+    src: str
+    dst: str
+    out_file: str
+    ctx_file: Path | None = None
+
+def parse_jobs(lines):
+    """
+    Parse jobs file lines into Jobs, exiting on the first malformed line.
+    """
+    jobs = []
+    for n, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            fields = shlex.split(line)
+        except ValueError as e:
+            sys.exit(f"Jobs line {n}: {e}")
+        if len(fields) not in (3, 4):
+            sys.exit(f"Jobs line {n}: expected SRC DST OUTPUT [CONTEXT_FILE], got {line.strip()!r}")
+        ctx_file = None
+        if len(fields) == 4:
+            try:
+                ctx_file = must_exist_file(fields[3])
+            except argparse.ArgumentTypeError as e:
+                sys.exit(f"Jobs line {n}: {e}")
+        jobs.append(Job(n, fields[0], fields[1], fields[2], ctx_file))
+    return jobs
+
+# Per-process state of a pool worker, set up once by _init_worker
+_worker = {}
+
+def _init_worker(repo_path, cache_dir, options):
+    _worker["session"] = RepoSession(repo_path)
+    _worker["cache"] = ResultCache(cache_dir)
+    _worker["options"] = options
+
+def _run_job(job, src, dst):
+    """
+    Generate one review in a pool worker. Returns (error or None, seconds,
+    cache hits, cache misses); progress output is dropped.
+    """
+    cache = _worker["cache"]
+    hits, misses = cache.hits, cache.misses
+    options = _worker["options"]
+    start = time.perf_counter()
+    error = None
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            generate_review(
+                ctx_file=job.ctx_file or options["ctx_file"],
+                task_file=options["task_file"],
+                out_file=job.out_file,
+                src=src,
+                dst=dst,
+                repo_path=_worker["session"].root,
+                snapshot=True,
+                cache=cache,
+                incremental=options["incremental"],
+                max_tokens=options["max_tokens"],
+                deadline=Deadline(options["deadline"], options["timeouts"]),
+                session=_worker["session"]
+            )
+    except SystemExit as e:
+        error = str(e.code)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return error, time.perf_counter() - start, cache.hits - hits, cache.misses - misses
+
+def prelint(session, pairs, cache, timeouts=None, workers=1):
+    """
+    Lint the files each (src, dst) pair reviews, once per destination and
+    from its snapshot, into the cache. Pool workers only share the cache,
+    so jobs running at the same time would otherwise all miss on the blobs
+    they have in common and lint them again. Returns (hits, misses).
+    """
+    hits, misses = cache.hits, cache.misses
+    by_dst = defaultdict(dict)
+    for src, dst in pairs:
+        changes = blob_index(src, dst, session.root)
+        classes = classify(src, dst, changes, session.root, None, session.objects)
+        by_dst[dst].update(dict.fromkeys(f for f in changes if f not in classes.skipped))
+    for dst, files in by_dst.items():
+        with Snapshot(session.objects, dst, list(files)) as snap:
+            run_lint_stage(
+                list(files), snap.root, cache=cache,
+                deadline=Deadline(None, timeouts), workers=workers
+            )
+    return cache.hits - hits, cache.misses - misses
+
+def run_batch(jobs, repo_path, ctx_file, task_file=None, workers=None, cache_dir=None,
+              incremental=False, max_tokens=None, deadline=None, timeouts=None):
+    """
+    Run all jobs and print one status line per job plus the throughput.
+    Returns the number of failed jobs.
+    """
+    start = time.perf_counter()
+    # Resolve every distinct ref once, through one cat-file process
+    with RepoSession(repo_path) as session:
+        if session.remote_url is None:
+            sys.exit("Failed to get remote URL for 'origin'")
+        resolved = {}
+        for ref in {r for job in jobs for r in (job.src, job.dst)}:
+            try:
+                resolved[ref] = session.objects.resolve(ref)
+            except GitObjectError:
+                resolved[ref] = None
+        root = session.root
+        pairs = {
+            (resolved[job.src], resolved[job.dst]) for job in jobs
+            if resolved[job.src] and resolved[job.dst]
+        }
+        hits, misses = prelint(session, pairs, ResultCache(cache_dir), timeouts, workers or os.cpu_count())
+
+    options = {
+        "ctx_file": ctx_file,
+        "task_file": task_file,
+        "incremental": incremental,
+        "max_tokens": max_tokens,
+        "deadline": deadline,
+        "timeouts": timeouts,
+    }
+    failed = 0
+    with ProcessPoolExecutor(
+        workers or os.cpu_count(),
+        initializer=_init_worker, initargs=(root, cache_dir, options)
+    ) as pool:
+        futures = {}
+        for job in jobs:
+            missing = [r for r in (job.src, job.dst) if resolved[r] is None]
+            if missing:
+                failed += 1
+                print(f"FAILED line {job.line}: Branch or ref not found: {missing[0]}")
+                continue
+            futures[pool.submit(_run_job, job, resolved[job.src], resolved[job.dst])] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            error, seconds, job_hits, job_misses = future.result()
+            hits += job_hits
+            misses += job_misses
+            if error:
+                failed += 1
+                print(f"FAILED line {job.line}: {job.src}..{job.dst}: {error}")
+            else:
+                print(f"ok     {job.src}..{job.dst} -> {job.out_file} ({seconds:.2f}s)")
+    elapsed = time.perf_counter() - start
+    done = len(jobs) - failed
+    rate = done / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"\n{done} of {len(jobs)} reviews in {elapsed:.1f}s ({rate:.1f} reviews/min)")
+    print(f"Cache: {hits} hits, {misses} misses")
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="generate-review batch",
+        description="Generate many reviews of one repository, sharing work between them"
+    )
+    parser.add_argument(
+        "jobs_file", type=str,
+        help="File with one 'SRC DST OUTPUT [CONTEXT_FILE]' job per line ('-' for stdin)"
+    )
+    parser.add_argument(
+        "-c", "--context-file", type=must_exist_file, required=True,
+        help="Feature context for jobs that do not name their own"
+    )
+    parser.add_argument(
+        "-t", "--task-file", type=must_exist_file,
+        help="Path to the .txt file with AI task instructions"
+    )
+    parser.add_argument(
+        "-r", "--repo-path", type=must_be_repo, default=".",
+        help="Path to the Git repository (default: current dir)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int,
+        help="Worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str,
+        help="Result cache directory (default: ~/.cache/git-ai-review)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Do not use the persistent cache; results are still shared within the batch"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only re-render file sections that changed since the last run on each output file"
+    )
+    parser.add_argument(
+        "--max-tokens", type=int,
+        help="Approximate token budget per review"
+    )
+    parser.add_argument(
+        "--deadline", type=float, metavar="SECONDS",
+        help="Time budget for each review"
+    )
+    parser.add_argument(
+        "--timeout", action="append", type=tool_limit(float), metavar="TOOL=SECONDS",
+        help="Per-tool timeout override, e.g. dotnet=120 (repeatable)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.jobs_file == "-":
+        jobs = parse_jobs(sys.stdin.read().splitlines())
+    else:
+        try:
+            jobs = parse_jobs(Path(args.jobs_file).read_text(encoding="utf-8").splitlines())
+        except OSError as e:
+            sys.exit(f"Failed to read jobs file {args.jobs_file}: {e}")
+    if not jobs:
+        sys.exit("No jobs to run")
+
+    # Jobs always lint from snapshots: the working tree matches at most one dst
+    with contextlib.ExitStack() as stack:
+        cache_dir = args.cache_dir
+        if args.no_cache:
+            cache_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="git-ai-review-batch-"))
+        failed = run_batch(
+            jobs, args.repo_path, args.context_file, args.task_file, args.jobs, cache_dir,
+            args.incremental, args.max_tokens, args.deadline,
+            parse_tool_limits(args.timeout, float)
+        )
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,172 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "git-ai-review"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# In-process analysis engines and the version their cached results depend
+# on; each engine module registers itself here on import
+BUILTIN_TOOLS = {}
+
+def git_blob_sha(data: bytes) -> str:
+    """
+    Return the SHA-1 git would assign to a blob with this content.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def file_blob_sha(path):
+    """
+    Return the blob SHA of a file on disk, or None if it cannot be read.
+    """
+    try:
+        return git_blob_sha(Path(path).read_bytes())
+    except OSError:
+        return None
+
+@functools.cache
+def tool_version(tool):
+    """
+    Return a version string for an analysis tool, looked up once per process.
+    """
+    if tool in BUILTIN_TOOLS:
+        return f"builtin-{BUILTIN_TOOLS[tool]}"
+    if tool == "flake8":
+        try:
+            import flake8
+            return flake8.__version__
+        except ImportError:
+            pass
+    if not shutil.which(tool):
+        return "missing"
+    try:
+        cp = subprocess.run([tool, "--version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    lines = (cp.stdout or cp.stderr).strip().splitlines()
+    return lines[0] if lines else "unknown"
+
+class ResultCache:
+    """
+    Content-addressed on-disk store for analysis results.
+
+    Entries are keyed on (tool, tool version, config hash, blob SHAs), so a
+    result is reused whenever the same tool sees the same content again,
+    across reviews and rebases. Total size is capped; the least recently
+    used entries are evicted first.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool, config_hash, *blob_shas):
+        parts = [tool, tool_version(tool), config_hash, *blob_shas]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.root / key[:2] / key[2:]
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        data = json.dumps(value).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def cached(self, tool, blob_shas, compute, config_hash=""):
+        """
+        Return the cached result of compute() for these blobs, computing and
+        storing it on a miss. None results are not cached.
+        """
+        if any(sha is None for sha in blob_shas):
+            return compute()
+        key = self.key(tool, config_hash, *blob_shas)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    async def acached(self, tool, blob_shas, compute, config_hash=""):
+        """
+        Like cached(), for a compute() coroutine function.
+        """
+        if any(sha is None for sha in blob_shas):
+            return await compute()
+        key = self.key(tool, config_hash, *blob_shas)
+        value = self.get(key)
+        if value is None:
+            value = await compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def _entries(self):
+        if not self.root.is_dir():
+            return
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir():
+                yield from (e for e in os.scandir(bucket.path) if e.is_file())
+
+    def _scan_size(self):
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache is at 90% of its cap.
+        """
+        entries = sorted(
+            ((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries())
+        )
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses"
@@ -0,0 +1,109 @@
+import re
+
+from git_ai_review.diff_engine import Hunk
+
+DEFAULT_CHUNK_TOKENS = 1250
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate: about four characters per token for ASCII text,
+    three UTF-8 bytes per token otherwise. Callers may pass any other
+    callable with the same signature (e.g. a real tokenizer's counter).
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    return (len(text.encode("utf-8")) + 2) // 3
+
+def _is_boundary(line: str) -> bool:
+    """
+    A diff line whose code starts in column 0 (a top-level def, class or
+    closing brace): the preferred place to cut an oversized hunk.
+    """
+    return len(line) > 1 and not line[1].isspace()
+
+def split_hunk(hunk, max_tokens, estimator=estimate_tokens):
+    """
+    Split a hunk that is over budget into smaller, valid hunks with their
+    own @@ headers, cutting at function boundaries where possible and never
+    inside a line.
+    """
+    m = _HUNK_HEADER.match(hunk.header)
+    if not m:
+        return [hunk]
+    old_no, new_no, section = int(m[1]), int(m[3]), m[5]
+    # A zero-length side is numbered from the line before it
+    if m[2] == "0":
+        old_no += 1
+    if m[4] == "0":
+        new_no += 1
+
+    pieces = []
+    body, cost = [], 0
+    start_old, start_new = old_no, new_no
+    last_boundary = None
+
+    def flush(upto):
+        nonlocal body, cost, start_old, start_new, last_boundary
+        head, body = body[:upto], body[upto:]
+        o = sum(1 for line in head if line[:1] in (" ", "-"))
+        n = sum(1 for line in head if line[:1] in (" ", "+"))
+        header = (
+            f"@@ -{start_old - (o == 0)},{o} +{start_new - (n == 0)},{n} @@{section}"
+        )
+        pieces.append(Hunk(header, head))
+        start_old, start_new = start_old + o, start_new + n
+        cost = sum(estimator(line) + 1 for line in body)
+        last_boundary = None
+
+    for line in hunk.lines:
+        line_cost = estimator(line) + 1
+        if body and cost + line_cost > max_tokens:
+            cut = last_boundary if last_boundary else len(body)
+            flush(cut)
+        if body and _is_boundary(line):
+            last_boundary = len(body)
+        body.append(line)
+        cost += line_cost
+    if body or not pieces:
+        flush(len(body))
+    return pieces
+
+def chunk_patch(patch, max_tokens=DEFAULT_CHUNK_TOKENS, estimator=estimate_tokens):
+    """
+    Split one FilePatch into texts of at most max_tokens (estimated).
+
+    Chunks break only between hunks, or inside an oversized hunk at a
+    function boundary; every chunk repeats the file header and starts with
+    a valid hunk header. Runs in time linear in the size of the patch.
+    """
+    header = "".join(line + "\n" for line in patch.header)
+    header_cost = estimator(header)
+    budget = max(max_tokens - header_cost, 1)
+
+    chunks, current, cost = [], [], 0
+    for hunk in patch.hunks:
+        hunk_cost = estimator(hunk.header) + 1 + sum(estimator(line) + 1 for line in hunk.lines)
+        pieces = [(hunk, hunk_cost)]
+        if hunk_cost > budget:
+            pieces = [
+                (p, estimator(p.header) + 1 + sum(estimator(line) + 1 for line in p.lines))
+                for p in split_hunk(hunk, max(budget - estimator(hunk.header) - 1, 1), estimator)
+            ]
+        for piece, piece_cost in pieces:
+            if current and cost + piece_cost > budget:
+                chunks.append(current)
+                current, cost = [], 0
+            current.append(piece)
+            cost += piece_cost
+    if current or not chunks:
+        chunks.append(current)
+
+    texts = []
+    for hunks in chunks:
+        body = "".join(
+            h.header + "\n" + "".join(line + "\n" for line in h.lines) for h in hunks
+        )
+        texts.append(header + body)
+    return texts
@@ -0,0 +1,132 @@
+import fnmatch
+import subprocess
+from dataclasses import dataclass
+
+from git_ai_review.diff_engine import numstat_index
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.planner import is_generated_path
+from git_ai_review.profiler import span
+
+# Why a file is kept out of the lint/analyzer/diff stages
+BINARY, NO_DIFF, GENERATED, VENDORED, EXCLUDED, TOO_LARGE = (
+    "binary", "diff disabled", "generated", "vendored", "excluded", "too large"
+)
+
+DEFAULT_VENDOR_GLOBS = (
+    "vendor/*", "*/vendor/*",
+    "third_party/*", "*/third_party/*",
+    "node_modules/*", "*/node_modules/*",
+    "wwwroot/lib/*", "*/wwwroot/lib/*",
+)
+DEFAULT_MAX_LINES = 5000
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+_NULL_SHA = "0" * 40
+
+@dataclass
+class ClassifyRules:
+    """
+    What the pre-pass skips. Generated and vendored files are recognised by
+    name and by the linguist-generated / linguist-vendored attributes, and
+    files with `-diff` (or `binary`) in .gitattributes are treated as
+    binary. globs are matched against the whole path; a size limit of None
+    disables that check.
+    """
+    globs: tuple = ()
+    max_lines: int | None = DEFAULT_MAX_LINES
+    max_bytes: int | None = DEFAULT_MAX_BYTES
+    enabled: bool = True
+
+@dataclass
+class Classification:
+    """
+    numstat counts of every changed file, and the files to skip with why.
+    """
+    numstat: dict
+    skipped: dict
+
+    def stat_line(self, f):
+        """
+        The one-line entry a skipped file gets instead of its section body.
+        """
+        added, deleted, binary = self.numstat.get(f, (0, 0, False))
+        if binary:
+            return f"*Skipped ({self.skipped[f]}).*"
+        return f"*Skipped ({self.skipped[f]}): {added} added, {deleted} deleted lines.*"
+
+def check_attributes(paths, ref, repo_path, names=("linguist-generated", "linguist-vendored", "diff")):
+    """
+    Return {path: {attribute: value}} for the attributes that are set or
+    unset on each path, from one `git check-attr --stdin`. The attributes
+    are read from ref's .gitattributes where git supports --source, and
+    from the working tree otherwise.
+    """
+    if not paths:
+        return {}
+    data = "".join(p + "\0" for p in paths).encode("utf-8")
+    for source in ([f"--source={ref}"], []):
+        args = ["git", "check-attr", "-z", "--stdin", *source, *names]
+        with span("git", "git check-attr", cmd=args) as s:
+            cp = subprocess.run(args, cwd=str(repo_path), input=data, capture_output=True)
+            s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+        if cp.returncode == 0:
+            break
+    else:
+        return {}
+    attrs = {}
+    tokens = cp.stdout.decode("utf-8", errors="replace").split("\0")
+    for i in range(0, len(tokens) - 2, 3):
+        path, name, value = tokens[i:i + 3]
+        if value != "unspecified":
+            attrs.setdefault(path, {})[name] = value
+    return attrs
+
+def _flag(attrs, name, default):
+    """
+    An attribute as a bool: explicit values win over the name-based default.
+    """
+    value = attrs.get(name)
+    if value is None:
+        return default
+    return value not in ("unset", "false")
+
+def classify(src, dst, changes, repo_path, rules=None, objects=None):
+    """
+    Classify the changed files (a blob_index result) in one `git diff
+    --numstat -z` and one `git check-attr` run. Blob sizes are looked up
+    through objects (a GitObjects) when a byte limit is set.
+    """
+    rules = rules or ClassifyRules()
+    stats = numstat_index(src, dst, repo_path)
+    skipped = {}
+    if not rules.enabled:
+        return Classification(stats, skipped)
+    attrs = check_attributes(list(changes), dst, repo_path)
+    for f, change in changes.items():
+        added, deleted, binary = stats.get(f, (0, 0, False))
+        a = attrs.get(f, {})
+        if binary:
+            reason = BINARY
+        elif a.get("diff") == "unset":
+            reason = NO_DIFF
+        elif _flag(a, "linguist-generated", is_generated_path(f)):
+            reason = GENERATED
+        elif _flag(a, "linguist-vendored", any(fnmatch.fnmatchcase(f, g) for g in DEFAULT_VENDOR_GLOBS)):
+            reason = VENDORED
+        elif any(fnmatch.fnmatchcase(f, g) for g in rules.globs):
+            reason = EXCLUDED
+        elif rules.max_lines is not None and added + deleted > rules.max_lines:
+            reason = TOO_LARGE
+        elif rules.max_bytes is not None and objects is not None and _blob_size(objects, change) > rules.max_bytes:
+            reason = TOO_LARGE
+        else:
+            continue
+        skipped[f] = reason
+    return Classification(stats, skipped)
+
+def _blob_size(objects, change):
+    sha = change.new_sha if change.new_sha != _NULL_SHA else change.old_sha
+    try:
+        return objects.info(sha)[2]
+    except GitObjectError:
+        return 0
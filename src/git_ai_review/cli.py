@@ -2,14 +2,29 @@
 #!/usr/bin/env python3
 
 import argparse
-import subprocess
+import functools
 import sys
 import os
-import shutil
+import threading
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from git_ai_review.git_wrapper import must_exist_file, must_be_repo, run_git
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.session import RepoSession
+from git_ai_review.diff_engine import DEFAULT_MAX_PATCH_BYTES, OrderedPatches, blob_index, iter_diff
+from git_ai_review.classify import DEFAULT_MAX_BYTES, DEFAULT_MAX_LINES, ClassifyRules, classify
+from git_ai_review.commit_index import build_commit_index
+from git_ai_review.lint import config_hashes, linter_for, run_lint_stage
+from git_ai_review.snapshot import Snapshot, tree_configs
+from git_ai_review.cache import ResultCache, tool_version
+from git_ai_review.manifest import Manifest, section_key
+from git_ai_review.writer import ReviewWriter
+from git_ai_review.planner import CONTEXT, FULL, SKIPPED, STATS, SectionPlan, plan_sections
+from git_ai_review.profiler import span, start_profiling, stop_profiling
+from git_ai_review.deadline import Deadline
+from git_ai_review.async_runner import parse_tool_limits, tool_limit
 
 def generate_review(
     ctx_file: Path,
@@ -17,122 +32,298 @@ def generate_review(
     out_file: str,
     src: str,
     dst: str,
-    repo_path: Path
+    repo_path: Path,
+    snapshot: bool = False,
+    cache: ResultCache | None = None,
+    incremental: bool = False,
+    max_tokens: int | None = None,
+    deadline: Deadline | None = None,
+    session: RepoSession | None = None,
+    rules: ClassifyRules | None = None,
+    jobs: int = 1,
+    max_patch_bytes: int | None = DEFAULT_MAX_PATCH_BYTES,
+    log=None
 ) -> None:
     """
     Generate an AI-friendly review summary for the changes between two Git refs.
+
+    With snapshot=True the linters run on the files as they are at dst,
+    written to a scratch directory, instead of on the working tree.
+    A ResultCache lets unchanged files reuse lint results from earlier runs.
+    With incremental=True a manifest is kept next to out_file and sections
+    of files whose inputs did not change are copied from the last review.
+    max_tokens caps the estimated prompt size by trimming the diffs of the
+    least important files first.
+    A Deadline bounds each linter run and skips linting (marked in the
+    review) when the run is close to its time budget.
+    out_file may also be an open binary stream, and a RepoSession owned
+    by the caller can be passed in to reuse its repository state.
+    Binary, generated, vendored and oversized files (see ClassifyRules)
+    only get a one-line stat entry and skip lint and diff rendering.
+    With jobs > 1 the linters run side by side and file sections are built
+    on a pool of that many threads, each slice of the files reading its own
+    `git diff`; sections are still written in group and file order.
+    Diffs are read from git as they stream in, and each file's diff is cut
+    (with a marker) after max_patch_bytes.
+    Progress lines are passed to log, or printed when it is None.
     """
+    # Progress goes to stderr when the review itself is streamed
+    to_path = isinstance(out_file, str) and out_file != "-"
+    log = log or functools.partial(print, file=sys.stdout if to_path else sys.stderr)
+
     # Read optional AI task instructions and feature context
     task_text = task_file.read_text(encoding="utf-8") if task_file else ""
     context = ctx_file.read_text(encoding="utf-8")
 
-    # Ensure both source and destination refs exist
+    # Repository root, remote and object reader
+    owned = session is None
+    if owned:
+        session = RepoSession(repo_path)
+    objects = session.objects
+
+    # Resolve both refs to commits once, so the whole run sees one snapshot
+    resolved = []
     for ref in (src, dst):
         try:
-            subprocess.run(
-                ["git", "rev-parse", "--verify", ref],
-                cwd=str(repo_path), capture_output=True, text=True, check=True
-            )
-        except subprocess.CalledProcessError:
+            resolved.append(objects.resolve(ref))
+        except GitObjectError:
             sys.exit(f"Branch or ref not found: {ref}")
+    src, dst = resolved
 
-    # Determine repository root and name
-    top = subprocess.run(
-        ["git", "rev-parse", "--show-toplevel"],
-        cwd=str(repo_path), capture_output=True, text=True, check=True
-    ).stdout.strip()
-    repo_root = Path(top).resolve()
-    print(f"Repository path:  {repo_root}")
-    print(f"Repository name:  {repo_root.name}")
-
-    # Fetch and parse remote origin URL
-    try:
-        remote_url = subprocess.run(
-            ["git", "remote", "get-url", "origin"],
-            cwd=str(repo_path), capture_output=True, text=True, check=True
-        ).stdout.strip()
-    except subprocess.CalledProcessError:
+    # Repository root and remote origin
+    repo_root = session.root
+    log(f"Repository path:  {repo_root}")
+    log(f"Repository name:  {repo_root.name}")
+    if session.remote_url is None:
         sys.exit("Failed to get remote URL for 'origin'")
-    url = remote_url[:-4] if remote_url.endswith(".git") else remote_url
-    path = url.split(":", 1)[1] if url.startswith("git@") else url.split("/", 3)[-1]
-    remote_repo_name = Path(path).name
-    print(f"Remote URL:        {remote_url}")
-    print(f"Remote repo name:  {remote_repo_name}\n")
-
-    # Build the initial sections with task, context, stats, and commit list
-    parts = [
+    log(f"Remote URL:        {session.remote_url}")
+    log(f"Remote repo name:  {session.remote_repo_name}\n")
+
+    # Walk the commit range once; it feeds both COMMITS and per-file summaries
+    history = build_commit_index(src, dst, repo_path)
+
+    # Blob SHAs on both sides of every change, from one `git diff --raw`
+    changes = blob_index(src, dst, repo_path)
+    changed = list(changes)
+
+    # Classify them from numstat and .gitattributes before any real work
+    classes = classify(src, dst, changes, repo_path, rules, objects)
+    stats = classes.numstat
+    skipped = classes.skipped
+
+    # Key each file section on what it is rendered from, including the lint
+    # config around it (at dst when linting a snapshot); with --incremental
+    # sections whose key is unchanged are copied from the previous review
+    lint_configs = config_hashes(
+        repo_root, [f for f in changed if f not in skipped],
+        tree_configs(objects, dst) if snapshot else None
+    )
+    keys = {
+        f: section_key(f, c.old_path, c.old_sha, c.new_sha, SKIPPED, skipped[f])
+        if f in skipped else section_key(
+            f, c.old_path, c.old_sha, c.new_sha,
+            history.history(f).latest_subject,
+            tool_version(linter.tool) if (linter := linter_for(f)) else None,
+            lint_configs[f] if linter else None,
+            snapshot, max_patch_bytes
+        )
+        for f, c in changes.items()
+    }
+    incremental = incremental and to_path
+    previous = Manifest.load(out_file) if incremental else None
+    reused = previous.reuse(keys) if previous else set()
+    stale = [f for f in changed if f not in reused]
+
+    # Group changed files by their top-level directory
+    groups = defaultdict(list)
+    for f in changed:
+        key = f.split(os.sep, 1)[0] if os.sep in f else "."
+        groups[key].append(f)
+
+    def lint_files(files):
+        if snapshot:
+            with Snapshot(objects, dst, files) as snap:
+                return run_lint_stage(files, snap.root, cache=cache, deadline=deadline, workers=jobs)
+        return run_lint_stage(files, repo_root, cache=cache, deadline=deadline, workers=jobs)
+
+    # Lint all stale files up front, one run per tool
+    lint = lint_files([f for f in stale if f not in skipped])
+
+    header = [
         task_text,
         context,
         "\n--- STAT SUMMARY ---",
         run_git(["diff", "--stat"], src, dst, repo_path),
         "\n--- COMMITS ---",
-        run_git(["log", "--oneline"], src, dst, repo_path)
+        history.oneline()
     ]
 
-    # Group changed files by their top-level directory
-    changed = run_git(["diff", "--name-only"], src, dst, repo_path).splitlines()
-    groups = defaultdict(list)
-    for f in changed:
-        key = f.split(os.sep, 1)[0] if os.sep in f else "."
-        groups[key].append(f)
+    # Fit the review into the token budget: plan detail levels from numstat
+    # and lint counts, before any diff is rendered
+    levels = {f: SKIPPED if f in skipped else FULL for f in changed}
+    if max_tokens:
+        plans = []
+        for f in changed:
+            if f in skipped:
+                continue
+            added, deleted, binary = stats.get(f, (0, 0, False))
+            lint_count = previous.level(f)[1] if f in reused else len(lint.warnings.get(f, []))
+            plans.append(SectionPlan(f, added, deleted, binary, lint_count))
+        fixed = header + [classes.stat_line(f) for f in skipped]
+        estimate = plan_sections(plans, fixed, max_tokens)
+        levels.update((p.path, p.level) for p in plans)
+        trimmed = sum(1 for p in plans if p.level != FULL)
+        log(f"Token budget: ~{estimate} of {max_tokens} ({trimmed} sections trimmed)")
+
+    # Reused sections must have been rendered at the planned level
+    if reused:
+        replanned = [f for f in reused if previous.level(f)[0] != levels[f]]
+        if replanned:
+            reused.difference_update(replanned)
+            stale = [f for f in changed if f not in reused]
+            lint.merge(lint_files(replanned))
+        log(f"Reusing {len(reused)} of {len(changed)} file sections")
+    if skipped:
+        log(f"Skipped {len(skipped)} binary, generated, vendored or oversized files")
+    for tool, seconds in lint.timings.items():
+        log(f"Lint {tool}: {seconds:.2f}s")
+    if lint.skipped:
+        log(f"Lint skipped for {len(lint.skipped)} files (deadline or timeout)")
+    if cache is not None:
+        log(f"Cache: {cache.stats()}")
+
+    # Sections in output order: by group, then as git lists the files
+    order = [(group, f) for group, files in sorted(groups.items()) for f in files]
+    stale_set = set(stale)
+
+    # Stream the diffs (only stale files if any sections are reused or
+    # trimmed; both sides of a rename keep it detected) while rendering.
+    # With jobs > 1 the files are split into that many slices in output
+    # order, each read from its own `git diff` under its own lock.
+    streams = []
 
-    # For each group, add per-file summaries, lint warnings, and diffs
-    for group, files in sorted(groups.items()):
-        parts.append(f"\n## Directory: {group}")
-        for f in files:
-            parts.append(f"\n### File: {f}")
-            # Last commit message affecting this file
-            msgs = run_git(
-                ["log", "--pretty=format:%s"], src, dst, repo_path,
-                extra_args=["--", f]
-            ).splitlines()
-            parts.append(f"*Summary:* {msgs[0] if msgs else 'No commits'}")
-
-            # Run language-specific linters if available
-            file_path = repo_root / f
-            if f.endswith(".py") and shutil.which("flake8"):
-                lint = subprocess.run(
-                    ["flake8", "--format=%(row)d:%(col)d %(code)s %(text)s", str(file_path)],
-                    cwd=str(repo_root), capture_output=True, text=True
-                ).stdout.strip().splitlines() or ["None"]
-                parts.append("**Flake8 warnings:**")
-                parts.extend(lint)
-            elif f.endswith(".js") and shutil.which("eslint"):
-                lint = subprocess.run(
-                    ["eslint", "--quiet", "--format", "unix", str(file_path)],
-                    cwd=str(repo_root), capture_output=True, text=True
-                ).stdout.strip().splitlines() or ["None"]
-                parts.append("**ESLint warnings:**")
-                parts.extend(lint)
-            elif f.endswith(".dart") and shutil.which("dart"):
-                analysis = subprocess.run(
-                    ["dart", "analyze", str(file_path)],
-                    cwd=str(repo_root), capture_output=True, text=True
-                ).stdout.strip().splitlines() or ["None"]
-                parts.append("**Dart analyzer warnings:**")
-                parts.extend(analysis)
-            elif f.endswith(".cs") and shutil.which("dotnet"):
-                cs_out = subprocess.run(
-                    ["dotnet", "format", "--verify-no-changes", "--include", str(file_path)],
-                    cwd=str(repo_root), capture_output=True, text=True
-                ).stdout.strip().splitlines() or ["None"]
-                parts.append("**dotnet format warnings:**")
-                parts.extend(cs_out)
-
-            # Include the diff with function context
-            diff = run_git(
-                ["diff", "--function-context"], src, dst, repo_path,
-                extra_args=["--", f]
-            )
-            parts += ["```diff", diff, "```"]
-
-    # Write the assembled review to the output file
+    def diff_streams(level, diff_args):
+        files = [f for _, f in order if f in stale_set and levels[f] == level]
+        shards = {}
+        size = -(-len(files) // jobs) if files else 1
+        for i in range(0, len(files), size):
+            part = files[i:i + size]
+            paths = None
+            if len(part) < len(changed):
+                paths = [changes[f] for f in part]
+            stream = OrderedPatches(iter_diff(src, dst, repo_path, diff_args, paths, max_patch_bytes))
+            streams.append(stream)
+            shards.update(dict.fromkeys(part, (stream, threading.Lock())))
+        return shards
+
+    patches = {
+        FULL: diff_streams(FULL, ("--function-context",)),
+        CONTEXT: diff_streams(CONTEXT, ("-U3",)),
+    }
+
+    def build_section(f):
+        """
+        Return (section text, lint warning count) for one file.
+        """
+        with span("render", "section", file=f, level=levels[f], reused=f in reused):
+            if f in reused:
+                return previous.read(f), previous.level(f)[1]
+            if f in skipped:
+                return f"\n### File: {f}\n{classes.stat_line(f)}", 0
+            patch = None
+            if f in patches.get(levels[f], {}):
+                stream, lock = patches[levels[f]][f]
+                with lock:
+                    patch = stream.take(f)
+            section = render_file_section(f, history, lint, patch, levels[f], stats.get(f))
+            return section, len(lint.warnings.get(f, []))
+
+    # Stale sections are built ahead on the pool, at most a few per worker;
+    # `ahead` is the reorder buffer that hands them out in output order
+    pool = ThreadPoolExecutor(jobs) if jobs > 1 else None
+    pooled = iter([f for _, f in order if f in stale_set and f not in skipped] if pool else ())
+    ahead = {}
+
+    # Only the writer's own I/O is reported as a failed write; git, linter
+    # and snapshot errors surface as they are
+    def written(call, *args):
+        try:
+            return call(*args)
+        except OSError as e:
+            sys.exit(f"Failed to write output file {out_file}: {e}")
+
+    # Write each section as soon as it is ready
+    manifest = Manifest(src, dst, out_file if to_path else "-")
+    out = None
     try:
-        Path(out_file).write_text("\n".join(parts), encoding="utf-8")
-    except OSError as e:
-        sys.exit(f"Failed to write output file {out_file}: {e}")
+        out = written(ReviewWriter, out_file)
+        for part in header:
+            written(out.write, part)
+
+        # For each group, add per-file summaries, lint warnings, and diffs
+        current = None
+        for group, f in order:
+            if group != current:
+                written(out.write, f"\n## Directory: {group}")
+                current = group
+            while pool and len(ahead) < jobs * 4 and (nxt := next(pooled, None)):
+                ahead[nxt] = pool.submit(build_section, nxt)
+            section, lint_count = ahead.pop(f).result() if f in ahead else build_section(f)
+            # Sections with skipped lint are never reused
+            key = None if f in lint.skipped else keys[f]
+            manifest.add(f, key, *written(out.write, section), levels[f], lint_count)
+        written(out.commit)
+        if incremental:
+            written(manifest.save, out.offset)
+    finally:
+        if out:
+            # A review that was not committed leaves no temporary file behind
+            out.abort()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        for stream in streams:
+            stream.close()
+        if previous:
+            previous.close()
+        if owned:
+            session.close()
+
+def render_file_section(f, history, lint, patch, level=FULL, numstat=None):
+    """
+    Render one file's section: summary, linter warnings and diff (or, for
+    trimmed sections, the numstat line counts).
+    """
+    lines = [f"\n### File: {f}"]
+    # Last commit message affecting this file
+    lines.append(f"*Summary:* {history.history(f).latest_subject}")
+
+    # Language-specific linter warnings, if a linter ran
+    linted = lint.for_file(f)
+    if linted:
+        label, warnings = linted
+        lines.append(f"**{label}:**")
+        lines.extend(warnings or ["None"])
+
+    # Include the diff: with function context unless trimmed for the budget
+    if level == STATS:
+        added, deleted, _ = numstat or (0, 0, False)
+        lines.append(f"*Diff omitted to fit the token budget ({added} added, {deleted} deleted lines).*")
+        return "\n".join(lines)
+    if level == CONTEXT:
+        lines.append("*Diff shown with 3 lines of context to fit the token budget.*")
+    diff = patch.text().strip() if patch else ""
+    lines += ["```diff", diff, "```"]
+    return "\n".join(lines)
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from git_ai_review.server import main as serve_main
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from git_ai_review.batch import main as batch_main
+        batch_main(sys.argv[2:])
+        return
     parser = argparse.ArgumentParser(
         description="Generate an AI-friendly Git review summary"
     )
@@ -146,7 +337,7 @@ def main():
     )
     parser.add_argument(
         "-o", "--output-file", type=str, required=True,
-        help="Output file for the review"
+        help="Output file for the review ('-' for stdout)"
     )
     parser.add_argument(
         "-s", "--source", type=str, required=True,
@@ -160,16 +351,90 @@ def main():
         "-r", "--repo-path", type=must_be_repo, default=".",
         help="Path to the Git repository (default: current dir)"
     )
+    parser.add_argument(
+        "--snapshot", action="store_true",
+        help="Lint the destination ref from a temporary snapshot instead of the working tree"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str,
+        help="Result cache directory (default: ~/.cache/git-ai-review)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Do not read or write the result cache"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only re-render file sections that changed since the last run on this output file"
+    )
+    parser.add_argument(
+        "--max-tokens", type=int,
+        help="Approximate token budget for the whole review; low-ranked diffs are trimmed to fit"
+    )
+    parser.add_argument(
+        "--deadline", type=float, metavar="SECONDS",
+        help="Time budget for the whole run; linting is skipped (and marked) when it runs low"
+    )
+    parser.add_argument(
+        "--timeout", action="append", type=tool_limit(float), metavar="TOOL=SECONDS",
+        help="Per-tool timeout override, e.g. dotnet=120 (repeatable)"
+    )
+    parser.add_argument(
+        "--skip-glob", action="append", metavar="GLOB",
+        help="Also give files whose path matches GLOB only a stat line, e.g. 'assets/*' (repeatable)"
+    )
+    parser.add_argument(
+        "--max-file-lines", type=int, default=DEFAULT_MAX_LINES,
+        help=f"Skip files with more changed lines than this; 0 for no limit (default: {DEFAULT_MAX_LINES})"
+    )
+    parser.add_argument(
+        "--max-file-bytes", type=int, default=DEFAULT_MAX_BYTES,
+        help=f"Skip files larger than this many bytes; 0 for no limit (default: {DEFAULT_MAX_BYTES})"
+    )
+    parser.add_argument(
+        "--max-patch-bytes", type=int, default=DEFAULT_MAX_PATCH_BYTES,
+        help=f"Cut each file's diff after this many bytes; 0 for no limit (default: {DEFAULT_MAX_PATCH_BYTES})"
+    )
+    parser.add_argument(
+        "--no-classify", action="store_true",
+        help="Send every file through lint and diff, including binary, generated and vendored ones"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Threads for linting and building file sections; output order is unchanged (default: 1)"
+    )
+    parser.add_argument(
+        "--profile", type=str, metavar="TRACE_JSON",
+        help="Write a Chrome/Perfetto trace of git, linter and writer calls and print the slowest to stderr"
+    )
 
     args = parser.parse_args()
-    generate_review(
-        ctx_file=args.context_file,
-        task_file=args.task_file,
-        out_file=args.output_file,
-        src=args.source,
-        dst=args.destination,
-        repo_path=args.repo_path
-    )
+    deadline = Deadline(args.deadline, parse_tool_limits(args.timeout, float))
+    if args.profile:
+        start_profiling()
+    try:
+        generate_review(
+            ctx_file=args.context_file,
+            task_file=args.task_file,
+            out_file=args.output_file,
+            src=args.source,
+            dst=args.destination,
+            repo_path=args.repo_path,
+            snapshot=args.snapshot,
+            cache=None if args.no_cache else ResultCache(args.cache_dir),
+            incremental=args.incremental,
+            max_tokens=args.max_tokens,
+            deadline=deadline,
+            rules=ClassifyRules(
+                tuple(args.skip_glob or ()), args.max_file_lines or None,
+                args.max_file_bytes or None, not args.no_classify
+            ),
+            jobs=max(1, args.jobs),
+            max_patch_bytes=args.max_patch_bytes or None
+        )
+    finally:
+        if args.profile:
+            stop_profiling(args.profile)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,112 @@
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+from git_ai_review.profiler import span
+
+# Field/record separators that cannot appear in hashes or author names
+_FS, _RS = "\x1f", "\x1e"
+
+@dataclass
+class Commit:
+    sha: str
+    short: str
+    author: str
+    subject: str
+
+@dataclass
+class FileHistory:
+    """
+    Every commit in the range that touched one path, newest first.
+    """
+    commits: list[Commit] = field(default_factory=list)
+    added: int = 0
+    deleted: int = 0
+
+    @property
+    def latest_subject(self) -> str:
+        return self.commits[0].subject if self.commits else "No commits"
+
+    @property
+    def commit_count(self) -> int:
+        return len(self.commits)
+
+    @property
+    def authors(self) -> list[str]:
+        return list(dict.fromkeys(c.author for c in self.commits))
+
+    @property
+    def churn(self) -> int:
+        return self.added + self.deleted
+
+@dataclass
+class CommitIndex:
+    """
+    The commits of src..dst plus a path -> FileHistory lookup, built from a
+    single `git log` walk.
+    """
+    commits: list[Commit] = field(default_factory=list)
+    files: dict[str, FileHistory] = field(default_factory=dict)
+
+    def history(self, path: str) -> FileHistory:
+        return self.files.get(path) or FileHistory()
+
+    def oneline(self) -> str:
+        """
+        Render the range the way `git log --oneline` does.
+        """
+        return "\n".join(f"{c.short} {c.subject}" for c in self.commits)
+
+def _touch(index, path, commit, added, deleted):
+    hist = index.files.setdefault(path, FileHistory())
+    if not hist.commits or hist.commits[-1] is not commit:
+        hist.commits.append(commit)
+    # Binary files report "-" for both counts
+    hist.added += int(added) if added.isdigit() else 0
+    hist.deleted += int(deleted) if deleted.isdigit() else 0
+
+def parse_log(raw: str) -> CommitIndex:
+    """
+    Parse `git log -z --numstat --pretty=format:<_RS>%H<_FS>%h<_FS>%an<_FS>%s`.
+    """
+    index = CommitIndex()
+    for record in raw.split(_RS):
+        if not record:
+            continue
+        head, _, body = record.partition("\n")
+        sha, short, author, subject = head.split(_FS, 3)
+        commit = Commit(sha, short, author, subject)
+        index.commits.append(commit)
+
+        tokens = iter(body.split("\0"))
+        for tok in tokens:
+            if not tok:
+                continue
+            added, deleted, path = tok.split("\t", 2)
+            if path:
+                _touch(index, path, commit, added, deleted)
+            else:
+                # Renames/copies: the old and new paths follow as two tokens
+                old, new = next(tokens, ""), next(tokens, "")
+                _touch(index, old, commit, added, deleted)
+                _touch(index, new, commit, added, deleted)
+    return index
+
+def build_commit_index(src, dst, repo_path) -> CommitIndex:
+    """
+    Walk src..dst once and index which commits touched which paths.
+    """
+    args = [
+        "git", "log", "-z", "--numstat",
+        f"--pretty=format:{_RS}%H{_FS}%h{_FS}%an{_FS}%s", f"{src}..{dst}"
+    ]
+    with span("git", "git log", cmd=args) as s:
+        try:
+            cp = subprocess.run(
+                args, cwd=str(repo_path), capture_output=True, check=True
+            )
+            s.update(bytes_out=len(cp.stdout), exit_code=0)
+        except subprocess.CalledProcessError as e:
+            s.update(exit_code=e.returncode)
+            sys.exit(f"Git command failed ({e.cmd}):\n{e.stderr.decode(errors='replace').strip()}")
+    return parse_log(cp.stdout.decode("utf-8", errors="replace"))
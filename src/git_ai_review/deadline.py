@@ -0,0 +1,74 @@
+import time
+
+# Per-tool wall-clock limits in seconds; tools not listed run unbounded
+DEFAULT_TIMEOUTS = {
+    "dotnet": 600,
+    "dart": 300,
+    "flake8": 300,
+    "eslint": 300,
+    "diffsitter": 60,
+    "callgraph-gen": 120,
+    "metrics-cli": 60,
+}
+
+# Enrichments in the order they are given up as the deadline approaches,
+# with the share of the whole budget that must still be left to start one
+DEGRADE_ORDER = (
+    ("semantic-diff", 0.5),
+    ("call-graph", 0.4),
+    ("metrics", 0.3),
+    ("lint", 0.2),
+)
+# Share of the budget kept for git and writing the review itself
+FINAL_RESERVE = 0.1
+
+class ToolSkipped(Exception):
+    """
+    An enrichment was not run because of the deadline, or was killed after
+    its timeout. str() gives the reason to show in the review.
+    """
+
+class Deadline:
+    """
+    Per-tool timeouts plus an optional wall-clock budget for the whole run.
+
+    As the budget runs out, allows() starts refusing the enrichments in
+    DEGRADE_ORDER, cheapest to lose first, so a review is always written.
+    """
+
+    def __init__(self, seconds=None, timeouts=None):
+        self.budget = seconds
+        self.end = None if seconds is None else time.monotonic() + seconds
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+
+    def remaining(self):
+        if self.end is None:
+            return None
+        return max(self.end - time.monotonic(), 0.0)
+
+    def allows(self, stage):
+        """
+        Whether there is still time to start an enrichment stage.
+        """
+        if self.end is None or stage is None:
+            return True
+        share = dict(DEGRADE_ORDER).get(stage, 0.0)
+        return self.remaining() > share * self.budget
+
+    def check(self, stage):
+        """
+        Raise ToolSkipped if the stage may no longer start.
+        """
+        if not self.allows(stage):
+            raise ToolSkipped("deadline reached")
+
+    def timeout_for(self, tool):
+        """
+        Seconds tool may run: its own limit, cut to what is left of the
+        budget after the final reserve. None means no limit.
+        """
+        limit = self.timeouts.get(tool)
+        if self.end is not None:
+            left = max(self.remaining() - FINAL_RESERVE * self.budget, 1.0)
+            limit = left if limit is None else min(limit, left)
+        return limit
@@ -0,0 +1,173 @@
+"""
+Dependency graphs of .NET and Dart projects, cached by their manifests.
+
+Listing a solution's resolved packages takes the package managers tens of
+seconds, but the answer only depends on the manifests and lockfiles. Graphs
+are parsed into {project: {package: version}} and cached under a hash of
+those files' blob SHAs at a ref, so the graph of any ref seen before costs
+one `git ls-tree`, and two refs' graphs can be compared package by package.
+"""
+import hashlib
+import json
+import subprocess
+from pathlib import Path, PurePosixPath
+
+from git_ai_review.cache import file_blob_sha
+from git_ai_review.profiler import span
+
+DOTNET, DART = "dotnet", "dart"
+
+# Files the resolved graph depends on: (names, suffixes) per ecosystem
+MANIFESTS = {
+    DOTNET: ({"packages.lock.json", "Directory.Packages.props", "Directory.Build.props"}, (".csproj",)),
+    DART: ({"pubspec.yaml", "pubspec.lock"}, ()),
+}
+
+def manifest_blobs(ref, repo_path):
+    """
+    Return {path: blob sha} of the manifests and lockfiles of every
+    ecosystem at ref, from one `git ls-tree`.
+    """
+    args = ["git", "ls-tree", "-r", "-z", ref]
+    with span("git", "git ls-tree", cmd=args) as s:
+        cp = subprocess.run(args, cwd=str(repo_path), capture_output=True)
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    names = set().union(*(n for n, _ in MANIFESTS.values()))
+    suffixes = tuple(x for _, sfx in MANIFESTS.values() for x in sfx)
+    blobs = {}
+    for entry in cp.stdout.decode("utf-8", errors="replace").split("\0"):
+        meta, _, path = entry.partition("\t")
+        parts = meta.split(" ")
+        if len(parts) != 3 or parts[1] != "blob":
+            continue
+        name = PurePosixPath(path).name
+        if name in names or name.endswith(suffixes):
+            blobs[path] = parts[2]
+    return blobs
+
+def _of_kind(blobs, kind):
+    names, suffixes = MANIFESTS[kind]
+    return {
+        p: sha for p, sha in blobs.items()
+        if PurePosixPath(p).name in names or (suffixes and p.endswith(suffixes))
+    }
+
+def manifest_hash(blobs, kind):
+    """
+    Hash of one ecosystem's manifests (a manifest_blobs result), or None
+    if the ref has none.
+    """
+    mine = _of_kind(blobs, kind)
+    if not mine:
+        return None
+    digest = hashlib.sha256()
+    for path in sorted(mine):
+        digest.update(f"{path}\0{mine[path]}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+def worktree_matches(blobs, kind, repo_path):
+    """
+    Whether the working tree holds the same manifests as the ref, so a
+    graph computed there belongs to the ref.
+    """
+    root = Path(repo_path)
+    mine = _of_kind(blobs, kind)
+    # Tracked or untracked, a manifest the ref lacks changes the graph too
+    args = ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+    with span("git", "git ls-files", cmd=args) as s:
+        cp = subprocess.run(args, cwd=str(root), capture_output=True)
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    if cp.returncode != 0:
+        return False
+    listed = dict.fromkeys(cp.stdout.decode("utf-8", errors="replace").split("\0"))
+    present = {p for p in _of_kind(listed, kind) if (root / p).is_file()}
+    return present == set(mine) and all(file_blob_sha(root / p) == sha for p, sha in mine.items())
+
+def _json_from(output):
+    # Tools may print progress lines before the JSON document
+    start = output.find("{")
+    if start < 0:
+        return None
+    try:
+        return json.loads(output[start:])
+    except ValueError:
+        return None
+
+def parse_dotnet(output, repo_path):
+    """
+    Parse `dotnet list package --include-transitive --format json` into
+    {"project (framework)": {package: resolved version}}.
+    """
+    data = _json_from(output)
+    if not isinstance(data, dict):
+        return None
+    graph = {}
+    for project in data.get("projects", []):
+        path = project.get("path", "")
+        try:
+            path = Path(path).resolve().relative_to(Path(repo_path).resolve()).as_posix()
+        except ValueError:
+            pass
+        for fw in project.get("frameworks", []):
+            packages = {}
+            for p in fw.get("topLevelPackages", []) + fw.get("transitivePackages", []):
+                packages[p["id"]] = p.get("resolvedVersion") or p.get("requestedVersion", "")
+            graph[f"{path} ({fw.get('framework', '?')})"] = packages
+    return graph
+
+def parse_dart(output):
+    """
+    Parse `dart pub deps --style=json` into {root package: {package: version}}.
+    """
+    data = _json_from(output)
+    if not isinstance(data, dict):
+        return None
+    packages = {
+        p["name"]: p.get("version", "")
+        for p in data.get("packages", []) if p.get("kind") != "root"
+    }
+    return {data.get("root", "root"): packages}
+
+def dependency_graph(kind, ref, repo_path, run, blobs=None, cache=None):
+    """
+    Return the parsed graph of one ecosystem at ref, or None if the ref has
+    no manifests for it or the graph cannot be had. A cached graph is used
+    when there is one; otherwise run() (returning the tool's output) is
+    called, but only if the working tree has ref's manifests.
+    """
+    blobs = manifest_blobs(ref, repo_path) if blobs is None else blobs
+    key = manifest_hash(blobs, kind)
+    if key is None:
+        return None
+    cache_key = cache.key(kind, "deps", key) if cache else None
+    if cache_key and (graph := cache.get(cache_key)) is not None:
+        return graph
+    if not worktree_matches(blobs, kind, repo_path):
+        return None
+    output = run()
+    if not output:
+        return None
+    graph = parse_dotnet(output, repo_path) if kind == DOTNET else parse_dart(output)
+    if graph is not None and cache_key:
+        cache.put(cache_key, graph)
+    return graph
+
+def diff_graphs(old, new):
+    """
+    One line per added (+), removed (-) or re-versioned (~) package of each
+    project, or "" if the graphs are the same.
+    """
+    lines = []
+    for project in sorted(set(old) | set(new)):
+        before, after = old.get(project, {}), new.get(project, {})
+        for name in sorted(set(before) | set(after)):
+            if name not in before:
+                lines.append(f"+ {project}: {name} {after[name]}")
+            elif name not in after:
+                lines.append(f"- {project}: {name} {before[name]}")
+            elif before[name] != after[name]:
+                lines.append(f"~ {project}: {name} {before[name]} -> {after[name]}")
+    return "".join(line + "\n" for line in lines)
+
+def render_graph(graph):
+    return json.dumps(graph, indent=2, sort_keys=True) + "\n"
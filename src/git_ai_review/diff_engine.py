@@ -0,0 +1,302 @@
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+from git_ai_review.profiler import span
+from git_ai_review.stream import OutputStream, truncation_marker
+
+# Per-file cap on the diff text kept in memory; the rest is dropped
+DEFAULT_MAX_PATCH_BYTES = 4 * 1024 * 1024
+
+@dataclass
+class Hunk:
+    """
+    A single `@@ ... @@` hunk: its header line and the body lines below it.
+    """
+    header: str
+    lines: list[str] = field(default_factory=list)
+
+@dataclass
+class FilePatch:
+    """
+    The patch for one file, as split out of a whole-range `git diff`.
+    """
+    path: str
+    old_path: str
+    header: list[str] = field(default_factory=list)
+    hunks: list[Hunk] = field(default_factory=list)
+    is_binary: bool = False
+    is_rename: bool = False
+    is_new: bool = False
+    is_deleted: bool = False
+    truncated: int = 0
+
+    def lines(self):
+        """
+        Yield the patch lines in their original order.
+        """
+        yield from self.header
+        for hunk in self.hunks:
+            yield hunk.header
+            yield from hunk.lines
+
+    def text(self) -> str:
+        """
+        Return the patch text exactly as `git diff -- <path>` would print it.
+        """
+        return "".join(line + "\n" for line in self.lines())
+
+def unquote_path(p: str) -> str:
+    """
+    Undo git's C-style quoting of unusual path names ("a/t\\303\\251st").
+    """
+    if not (len(p) >= 2 and p[0] == '"' and p[-1] == '"'):
+        return p
+    escapes = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13}
+    raw, body, i = bytearray(), p[1:-1], 0
+    while i < len(body):
+        c = body[i]
+        if c != "\\":
+            raw += c.encode("utf-8")
+            i += 1
+            continue
+        nxt = body[i + 1]
+        if nxt in "01234567":
+            raw.append(int(body[i + 1:i + 4], 8))
+            i += 4
+        else:
+            raw.append(escapes.get(nxt, ord(nxt)))
+            i += 2
+    return raw.decode("utf-8", errors="replace")
+
+def _strip_prefix(p: str) -> str:
+    # git terminates ---/+++ names containing spaces with a tab
+    p = unquote_path(p[:-1] if p.endswith("\t") else p)
+    return p[2:] if p[:2] in ("a/", "b/") else p
+
+def _paths_from_git_line(line: str) -> tuple[str, str]:
+    """
+    Best-effort split of "diff --git a/X b/Y"; only relied on when no
+    ---/+++ or rename lines follow (mode changes, binaries, empty files).
+    """
+    rest = line[len("diff --git "):]
+    if rest.startswith('"'):
+        end = rest.index('" ', 1) + 1
+        return _strip_prefix(rest[:end]), _strip_prefix(rest[end + 1:])
+    half = (len(rest) - 1) // 2
+    if rest[half] == " " and rest[2:half] == rest[half + 3:]:
+        return rest[2:half], rest[half + 3:]
+    a, _, b = rest.partition(" b/")
+    return _strip_prefix(a), b
+
+def _close_patch(patch, max_bytes):
+    # A truncated patch ends with a marker line in place of what was dropped
+    if patch.truncated:
+        marker = truncation_marker("Diff", max_bytes, patch.truncated)
+        (patch.hunks[-1].lines if patch.hunks else patch.header).append(marker)
+    return patch
+
+def parse_patches(lines, max_bytes=None):
+    """
+    Parse an iterable of `git diff` output lines (without newlines) into
+    FilePatch objects, yielding each one as soon as it is complete.
+
+    With max_bytes, hunk lines past that many bytes of a file's patch are
+    dropped (counted in FilePatch.truncated) and a marker line is added.
+    """
+    patch = None
+    hunk = None
+    size = 0
+    for line in lines:
+        if line.startswith("diff --git "):
+            if patch:
+                yield _close_patch(patch, max_bytes)
+            old, new = _paths_from_git_line(line)
+            patch = FilePatch(path=new, old_path=old, header=[line])
+            hunk = None
+            size = len(line) + 1
+            continue
+        if patch is None:
+            continue
+        if hunk is not None or line.startswith("@@"):
+            size += len(line) + 1
+            if max_bytes is not None and (patch.truncated or size > max_bytes):
+                patch.truncated += 1
+                continue
+        if line.startswith("@@"):
+            hunk = Hunk(header=line)
+            patch.hunks.append(hunk)
+            continue
+        if hunk is not None:
+            hunk.lines.append(line)
+            continue
+
+        # Still inside the extended header
+        patch.header.append(line)
+        if line.startswith("new file mode"):
+            patch.is_new = True
+        elif line.startswith("deleted file mode"):
+            patch.is_deleted = True
+        elif line.startswith("rename from "):
+            patch.is_rename = True
+            patch.old_path = unquote_path(line[len("rename from "):])
+        elif line.startswith("rename to "):
+            patch.is_rename = True
+            patch.path = unquote_path(line[len("rename to "):])
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            patch.is_binary = True
+        elif line.startswith("--- ") and line != "--- /dev/null":
+            patch.old_path = _strip_prefix(line[4:])
+        elif line.startswith("+++ ") and line != "+++ /dev/null":
+            patch.path = _strip_prefix(line[4:])
+    if patch:
+        yield _close_patch(patch, max_bytes)
+
+@dataclass
+class BlobChange:
+    """
+    One line of `git diff --raw`: the blobs on either side of a change.
+    """
+    path: str
+    old_path: str
+    old_sha: str
+    new_sha: str
+    status: str
+
+def blob_index(src, dst, repo_path):
+    """
+    Return {path: BlobChange} for every file changed between src and dst,
+    in `git diff` order, from a single `git diff --raw` run.
+    """
+    args = ["git", "diff", "--raw", "-z", "--no-abbrev", f"{src}..{dst}"]
+    with span("git", "git diff --raw", cmd=args) as s:
+        cp = subprocess.run(args, cwd=str(repo_path), capture_output=True)
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    if cp.returncode != 0:
+        sys.exit(f"Git command failed (git diff --raw):\n{cp.stderr.decode(errors='replace').strip()}")
+    tokens = iter(cp.stdout.decode("utf-8", errors="replace").split("\0"))
+    changes = {}
+    for meta in tokens:
+        if not meta.startswith(":"):
+            continue
+        _, _, old_sha, new_sha, status = meta[1:].split(" ")
+        old_path = next(tokens)
+        path = next(tokens) if status[0] in "RC" else old_path
+        changes[path] = BlobChange(path, old_path, old_sha, new_sha, status)
+    return changes
+
+def numstat_index(src, dst, repo_path):
+    """
+    Return {path: (added, deleted, is_binary)} from one `git diff --numstat`.
+    """
+    args = ["git", "diff", "--numstat", "-z", f"{src}..{dst}"]
+    with span("git", "git diff --numstat", cmd=args) as s:
+        cp = subprocess.run(args, cwd=str(repo_path), capture_output=True)
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    if cp.returncode != 0:
+        sys.exit(f"Git command failed (git diff --numstat):\n{cp.stderr.decode(errors='replace').strip()}")
+    tokens = iter(cp.stdout.decode("utf-8", errors="replace").split("\0"))
+    stats = {}
+    for tok in tokens:
+        if not tok:
+            continue
+        added, deleted, path = tok.split("\t", 2)
+        if not path:
+            # Renames: the old and new paths follow as two tokens
+            next(tokens, "")
+            path = next(tokens, "")
+        binary = added == "-"
+        stats[path] = (0 if binary else int(added), 0 if binary else int(deleted), binary)
+    return stats
+
+def _iter_diff_once(src, dst, repo_path, diff_args, paths, max_bytes):
+    args = ["git", "-c", "core.quotePath=false", "diff", *diff_args, f"{src}..{dst}"]
+    if paths is not None:
+        args[1:1] = ["--literal-pathspecs"]
+        args += ["--", *paths]
+    # The stream stays open while sections render, so give it its own track
+    with span("git", "git diff", tid=id(args), cmd=args) as s:
+        # No single line may outgrow the per-file cap either
+        with OutputStream(args, cwd=str(repo_path), max_line=max_bytes) as proc:
+            yield from parse_patches(proc, max_bytes)
+        s.update(bytes_out=proc.bytes_read, exit_code=proc.returncode)
+    if proc.returncode != 0:
+        sys.exit(f"Git command failed ({' '.join(args)}):\n{proc.stderr.strip()}")
+
+# Pathspecs per `git diff` run, well under the command-line limit
+_PATHSPEC_BATCH = 500
+
+def _pathspec_batches(paths):
+    """
+    Split paths (file paths or BlobChanges) into pathspec lists of about
+    _PATHSPEC_BATCH entries. Both sides of a BlobChange always land in the
+    same list, and each path is listed once.
+    """
+    batch, seen = [], set()
+    for item in paths:
+        group = (item.old_path, item.path) if isinstance(item, BlobChange) else (item,)
+        group = [p for p in dict.fromkeys(group) if p not in seen]
+        if batch and len(batch) + len(group) > _PATHSPEC_BATCH:
+            yield batch
+            batch = []
+        batch += group
+        seen.update(group)
+    if batch:
+        yield batch
+
+def iter_diff(src, dst, repo_path, diff_args=("--function-context",), paths=None,
+              max_bytes=DEFAULT_MAX_PATCH_BYTES):
+    """
+    Run one `git diff <diff_args> src..dst` for the whole range (or just the
+    given paths; pass BlobChanges to keep both sides of a rename in the
+    same run, so it stays detected as one) and yield a FilePatch per
+    changed file while the output is still streaming in. Each patch keeps
+    at most max_bytes of diff text (None for no limit).
+    """
+    if paths is None:
+        yield from _iter_diff_once(src, dst, repo_path, diff_args, None, max_bytes)
+        return
+    for batch in _pathspec_batches(paths):
+        yield from _iter_diff_once(src, dst, repo_path, diff_args, batch, max_bytes)
+
+def diff_index(src, dst, repo_path, diff_args=("--function-context",), paths=None,
+               max_bytes=DEFAULT_MAX_PATCH_BYTES):
+    """
+    Return {path: FilePatch} for every file changed between src and dst, or
+    only for the given paths, each capped at max_bytes of diff text.
+
+    Deleted files are keyed by their old path, everything else by the new
+    path, matching what `git diff --name-only` lists.
+    """
+    return {p.path: p for p in iter_diff(src, dst, repo_path, diff_args, paths, max_bytes)}
+
+class OrderedPatches:
+    """
+    Hand out FilePatches from a streaming diff (an iter_diff generator) in
+    whatever order the caller renders them, holding back only the patches
+    that arrive early.
+    """
+
+    def __init__(self, patches):
+        self._stream = patches
+        self._early = {}
+
+    def take(self, path):
+        """
+        Return the patch for path (or None), consuming the stream up to it.
+        """
+        if path in self._early:
+            return self._early.pop(path)
+        for patch in self._stream:
+            if patch.path == path:
+                return patch
+            self._early[patch.path] = patch
+        return None
+
+    def close(self):
+        """
+        Close the stream; a git process still writing is killed and reaped
+        rather than read to the end.
+        """
+        self._stream.close()
+        self._early.clear()
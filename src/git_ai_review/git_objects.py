@@ -0,0 +1,142 @@
+import subprocess
+import threading
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class TreeEntry:
+    mode: str
+    type: str
+    sha: str
+    name: str
+
+class GitObjectError(LookupError):
+    """
+    Raised when an object spec does not name an object of the expected type.
+    """
+
+class GitObjects:
+    """
+    Long-lived access to a repository's objects over two persistent pipes,
+    `git cat-file --batch` and `git cat-file --batch-check`, so reading a
+    blob or tree costs a pipe round-trip instead of a fork.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = str(repo_path)
+        self._procs = {}
+        self._lock = threading.Lock()
+        self._resolved = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _proc(self, mode):
+        proc = self._procs.get(mode)
+        if proc is None:
+            proc = subprocess.Popen(
+                ["git", "cat-file", mode],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+            self._procs[mode] = proc
+        return proc
+
+    def _request(self, mode, spec):
+        """
+        Send one object spec and return (sha, type, size, body-or-None).
+        """
+        with self._lock:
+            proc = self._proc(mode)
+            proc.stdin.write(spec.encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline().rstrip(b"\n").decode("utf-8", errors="replace")
+            if header.endswith(" missing") or header.endswith(" ambiguous"):
+                raise GitObjectError(header)
+            sha, kind, size = header.split(" ")
+            body = None
+            if mode == "--batch":
+                body = proc.stdout.read(int(size))
+                proc.stdout.read(1)
+            return sha, kind, int(size), body
+
+    def info(self, spec):
+        """
+        Return (sha, type, size) for an object spec, without reading content.
+        """
+        sha, kind, size, _ = self._request("--batch-check", spec)
+        return sha, kind, size
+
+    def resolve(self, ref):
+        """
+        Resolve a ref to its commit SHA. Results are memoised, so a ref that
+        moves during a run keeps pointing at the commit first seen.
+        """
+        sha = self._resolved.get(ref)
+        if sha is None:
+            sha, _, _ = self.info(f"{ref}^{{commit}}")
+            self._resolved[ref] = sha
+        return sha
+
+    def forget_refs(self):
+        """
+        Drop memoised ref resolutions, e.g. between reviews in a long-lived process.
+        """
+        with self._lock:
+            self._resolved.clear()
+
+    def exists(self, spec):
+        try:
+            self.info(spec)
+        except GitObjectError:
+            return False
+        return True
+
+    def blob(self, sha):
+        """
+        Return the raw bytes of a blob.
+        """
+        _, kind, _, body = self._request("--batch", sha)
+        if kind != "blob":
+            raise GitObjectError(f"{sha} is a {kind}, not a blob")
+        return body
+
+    def blob_at(self, ref, path):
+        """
+        Return the bytes of path at ref, or None if it does not exist there.
+        """
+        try:
+            return self.blob(f"{self.resolve(ref)}:{path}")
+        except GitObjectError:
+            return None
+
+    def tree(self, ref, path=""):
+        """
+        List the entries of the tree at ref:path.
+        """
+        _, kind, _, body = self._request("--batch", f"{self.resolve(ref)}:{path}")
+        if kind != "tree":
+            raise GitObjectError(f"{ref}:{path} is a {kind}, not a tree")
+        # Binary tree format: "<mode> <name>\0<raw sha>" repeated
+        raw_len = len(self.resolve(ref)) // 2
+        entries, i = [], 0
+        while i < len(body):
+            sp = body.index(b" ", i)
+            nul = body.index(b"\0", sp)
+            mode = body[i:sp].decode("ascii")
+            name = body[sp + 1:nul].decode("utf-8", errors="replace")
+            sha = body[nul + 1:nul + 1 + raw_len].hex()
+            kind = "tree" if mode == "40000" else "commit" if mode == "160000" else "blob"
+            entries.append(TreeEntry(mode, kind, sha, name))
+            i = nul + 1 + raw_len
+        return entries
+
+    def close(self):
+        for proc in self._procs.values():
+            proc.stdin.close()
+            proc.wait()
+        self._procs.clear()
@@ -3,6 +3,9 @@ import subprocess
 import sys
 from pathlib import Path
 
+from git_ai_review.profiler import span
+from git_ai_review.stream import OutputStream
+
 def must_exist_file(p):
     """
     Ensure the given path points to an existing file.
@@ -34,12 +37,10 @@ def run_git(cmd, src, dst, repo_path, extra_args=None):
     args = ["git"] + cmd + [f"{src}..{dst}"]
     if extra_args:
         args += extra_args
-    try:
-        cp = subprocess.run(
-            args,
-            cwd=str(repo_path),
-            capture_output=True, text=True, check=True
-        )
-        return cp.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        sys.exit(f"Git command failed ({e.cmd}):\n{e.stderr.strip()}")
+    with span("git", f"git {cmd[0]}", cmd=args) as s:
+        with OutputStream(args, cwd=str(repo_path)) as proc:
+            out = proc.read()
+        s.update(bytes_out=proc.bytes_read, exit_code=proc.returncode)
+    if proc.returncode != 0:
+        sys.exit(f"Git command failed ({args}):\n{proc.stderr.strip()}")
+    return out.strip()
@@ -0,0 +1,433 @@
+import configparser
+import functools
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+
+from git_ai_review.cache import file_blob_sha
+from git_ai_review.profiler import span
+
+# Conservative command-line budgets; Windows caps CreateProcess at 32767 chars
+_CMDLINE_LIMIT = 30000 if os.name == "nt" else 120000
+
+# Files linters look for in a file's directory or any parent directory
+LINT_CONFIG_NAMES = {
+    "setup.cfg", "tox.ini", ".flake8", "pyproject.toml",
+    ".eslintrc", ".eslintrc.js", ".eslintrc.cjs", ".eslintrc.json",
+    ".eslintrc.yml", ".eslintrc.yaml", "eslint.config.js", "eslint.config.mjs",
+    "package.json", "analysis_options.yaml", "pubspec.yaml", ".editorconfig",
+    "Directory.Build.props", "Directory.Packages.props", "global.json",
+}
+LINT_CONFIG_SUFFIXES = (".sln", ".csproj")
+
+_LOCATED = re.compile(r"^(?P<path>.+?):(?P<row>\d+):(?P<col>\d+):? (?P<text>.*)$")
+_DOTNET = re.compile(r"^(?P<path>.+?)\((?P<row>\d+),(?P<col>\d+)\): (?P<text>.*)$")
+
+# flake8's style guides hold per-run report state, so in-process checks
+# from several threads take turns
+_FLAKE8_LOCK = threading.Lock()
+
+@dataclass(frozen=True)
+class Violation:
+    """
+    One structured linter finding.
+    """
+    row: int
+    col: int
+    code: str
+    text: str
+
+    def __str__(self):
+        return f"{self.row}:{self.col} {self.code} {self.text}"
+
+def _parse_located(output, resolve):
+    """
+    Parse "path:row:col[:] text" lines (flake8, eslint unix format).
+    """
+    for line in output.splitlines():
+        m = _LOCATED.match(line)
+        if m and (f := resolve(m["path"])):
+            yield f, f"{m['row']}:{m['col']} {m['text']}"
+
+def _parse_dart(output, resolve):
+    """
+    Parse `dart analyze --format=machine`:
+    SEVERITY|TYPE|CODE|FILE|LINE|COL|LENGTH|MESSAGE
+    """
+    for line in output.splitlines():
+        fields = line.split("|", 7)
+        if len(fields) == 8 and (f := resolve(fields[3])):
+            sev, _, code, _, row, col, _, msg = fields
+            yield f, f"{sev.lower()} - {row}:{col} - {msg} - {code.lower()}"
+
+def _parse_dotnet(output, resolve):
+    """
+    Parse `dotnet format` diagnostics: path(row,col): severity CODE: message
+    """
+    for line in output.splitlines():
+        m = _DOTNET.match(line.strip())
+        if m and (f := resolve(m["path"])):
+            yield f, f"{m['row']}:{m['col']} {m['text']}"
+
+# Config files flake8 reads its own section from
+_FLAKE8_CONFIG_NAMES = ("setup.cfg", "tox.ini", ".flake8")
+
+def _flake8_config(root):
+    """
+    The config file under root that has a flake8 section, or None.
+    """
+    for name in _FLAKE8_CONFIG_NAMES:
+        path = Path(root) / name
+        cfg = configparser.RawConfigParser()
+        try:
+            cfg.read(path, encoding="utf-8")
+        except (UnicodeDecodeError, configparser.Error):
+            continue
+        if "flake8" in cfg or "flake8:local-plugins" in cfg:
+            return str(path)
+    return None
+
+@functools.lru_cache(maxsize=16)
+def _flake8_style_guide(config, config_blob):
+    """
+    Load flake8 (options, config and plugins) once per config file and
+    contents; config_blob only keys the cache. Without a config file flake8
+    runs isolated rather than searching the process's cwd.
+    """
+    from flake8.api.legacy import StyleGuide
+    from flake8.main.application import Application
+    from flake8.options.parse_args import parse_args
+    from flake8.utils import normalize_path, parse_files_to_codes_mapping
+
+    app = Application()
+    app.plugins, app.options = parse_args(["--config", config] if config else ["--isolated"])
+    if config:
+        # flake8 anchors per-file-ignores paths to the cwd, not the config
+        base = os.path.dirname(config)
+        app.options.per_file_ignores = "\n".join(
+            f"{normalize_path(name, base)}:{','.join(codes)}"
+            for name, codes in parse_files_to_codes_mapping(app.options.per_file_ignores)
+        )
+    app.make_formatter()
+    app.make_guide()
+    app.make_file_checker_manager([])
+    return StyleGuide(app)
+
+def _flake8_in_process(paths, root):
+    """
+    Check paths with flake8's Python API, returning {path: [Violation]} or
+    None when flake8 cannot be imported or is too old for the API.
+    """
+    try:
+        from flake8.formatting.base import BaseFormatter
+    except ImportError:
+        return None
+
+    found = defaultdict(list)
+
+    class _Collect(BaseFormatter):
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def format(self, error):
+            return None
+
+        def handle(self, error):
+            found[error.filename].append(
+                Violation(error.line_number, error.column_number, error.code, error.text)
+            )
+
+    with _FLAKE8_LOCK:
+        config = _flake8_config(root)
+        try:
+            guide = _flake8_style_guide(config, file_blob_sha(config) if config else None)
+        except (ImportError, AttributeError, TypeError):
+            # Older flake8 releases lack the option-parsing API used above;
+            # the flake8 command then runs instead
+            return None
+        guide.init_report(_Collect)
+        guide.check_files(list(paths))
+    return found
+
+@dataclass(frozen=True)
+class Linter:
+    """
+    How to run one external linter over many files and split its output.
+    """
+    key: str
+    tool: str
+    label: str
+    extensions: tuple
+    command: tuple
+    parse: object
+    in_process: object = None
+
+LINTERS = [
+    Linter(
+        "py", "flake8", "Flake8 warnings", (".py",),
+        ("flake8", "--format=%(path)s:%(row)d:%(col)d %(code)s %(text)s"),
+        _parse_located, _flake8_in_process
+    ),
+    Linter(
+        "js", "eslint", "ESLint warnings", (".js", ".jsx"),
+        ("eslint", "--quiet", "--format", "unix"),
+        _parse_located
+    ),
+    Linter(
+        "dart", "dart", "Dart analyzer warnings", (".dart",),
+        ("dart", "analyze", "--format=machine"),
+        _parse_dart
+    ),
+    Linter(
+        "cs", "dotnet", "dotnet format warnings", (".cs",),
+        ("dotnet", "format", "--verify-no-changes", "--include"),
+        _parse_dotnet
+    ),
+]
+
+def linter_for(path):
+    """
+    Return the Linter responsible for a path, or None.
+    """
+    ext = Path(path).suffix.lower()
+    for linter in LINTERS:
+        if ext in linter.extensions:
+            return linter
+    return None
+
+def _chunks(base, paths, limit=_CMDLINE_LIMIT):
+    """
+    Split paths into as few argument lists as the command-line limit allows.
+    """
+    chunk, size = [], sum(len(a) + 1 for a in base)
+    for p in paths:
+        if chunk and size + len(p) + 1 > limit:
+            yield chunk
+            chunk, size = [], sum(len(a) + 1 for a in base)
+        chunk.append(p)
+        size += len(p) + 1
+    if chunk:
+        yield chunk
+
+@dataclass
+class LintResult:
+    """
+    Per-file warning lines plus the wall time spent in each tool.
+    In-process backends also keep their structured Violations in records.
+    Files whose linter was skipped or timed out map to the reason in skipped.
+    """
+    warnings: dict = field(default_factory=lambda: defaultdict(list))
+    records: dict = field(default_factory=lambda: defaultdict(list))
+    linted: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    skipped: dict = field(default_factory=dict)
+
+    def for_file(self, f):
+        """
+        Return (label, warning lines) for f, or None if no linter ran on it.
+        """
+        linter = self.linted.get(f)
+        if linter is None:
+            return None
+        if f in self.skipped:
+            return linter.label, [f"Skipped ({self.skipped[f]})"]
+        return linter.label, self.warnings.get(f, [])
+
+    def merge(self, other):
+        """
+        Fold the results of another lint run into this one.
+        """
+        for f, lines in other.warnings.items():
+            self.warnings[f].extend(lines)
+        for f, violations in other.records.items():
+            self.records[f].extend(violations)
+        self.linted.update(other.linted)
+        self.skipped.update(other.skipped)
+        for tool, seconds in other.timings.items():
+            self.timings[tool] = self.timings.get(tool, 0.0) + seconds
+
+def _is_config(name):
+    return name in LINT_CONFIG_NAMES or name.endswith(LINT_CONFIG_SUFFIXES)
+
+def worktree_configs(root):
+    """
+    List the (name, blob sha) config files of a directory under root.
+    """
+    def configs(d):
+        try:
+            names = sorted(os.listdir(Path(root) / d))
+        except OSError:
+            return []
+        return [
+            (name, blob) for name in names
+            if _is_config(name) and (blob := file_blob_sha(Path(root) / d / name))
+        ]
+    return configs
+
+def config_hashes(root, files, configs=None):
+    """
+    Return {file: hash} of the linter config files (see LINT_CONFIG_NAMES)
+    that sit next to or above each file under root. A file's hash depends
+    only on its own directories, so it is the same in every review.
+    configs(dir) lists a directory's config files (see worktree_configs,
+    the default).
+    """
+    configs = configs or worktree_configs(root)
+    found = {}
+
+    def listed(d):
+        # "path\0blob\0" of the config files directly in d, read once per dir
+        if d not in found:
+            found[d] = "".join(
+                f"{d}/{name}\0{blob}\0" if d else f"{name}\0{blob}\0"
+                for name, blob in configs(d)
+            )
+        return found[d]
+
+    hashes = {}
+    for f in files:
+        digest = hashlib.sha256()
+        for d in reversed(PurePosixPath(f).parents):
+            digest.update(listed("" if str(d) == "." else str(d)).encode("utf-8"))
+        hashes[f] = digest.hexdigest()
+    return hashes
+
+def _run_linter(linter, group, root, timeout=None):
+    """
+    Run one linter over group; return ({file: [line]}, {file: [Violation]},
+    {file: skip reason}, {files the tool failed on}) or None if neither the
+    in-process backend nor the tool is available. Batches that exceed
+    timeout are killed and skipped.
+    """
+    lookup = {os.path.normcase(str(root / f)): f for f in group}
+
+    def resolve(p):
+        return lookup.get(os.path.normcase(str(root / p)))
+
+    warnings, records, skipped, failed = defaultdict(list), defaultdict(list), {}, set()
+    paths = [str(root / f) for f in group]
+    file_of = dict(zip(paths, group))
+    found = None
+    if linter.in_process:
+        with span("lint", linter.tool, mode="in-process", files=len(paths)) as s:
+            if s:
+                s.update(bytes_in=sum(os.path.getsize(p) for p in paths))
+            found = linter.in_process(paths, root)
+    if found is not None:
+        for path, violations in found.items():
+            if f := resolve(path):
+                records[f].extend(violations)
+                warnings[f].extend(str(v) for v in violations)
+    elif shutil.which(linter.tool):
+        for chunk in _chunks(linter.command, paths):
+            with span("lint", linter.tool, cmd=list(linter.command), files=len(chunk)) as s:
+                if s:
+                    s.update(bytes_in=sum(os.path.getsize(p) for p in chunk))
+                try:
+                    cp = subprocess.run(
+                        [*linter.command, *chunk],
+                        cwd=str(root), capture_output=True, text=True, timeout=timeout
+                    )
+                except subprocess.TimeoutExpired:
+                    s.update(error="timeout")
+                    for p in chunk:
+                        skipped[file_of[p]] = f"timed out after {timeout:.0f}s"
+                    continue
+                s.update(bytes_out=len(cp.stdout) + len(cp.stderr), exit_code=cp.returncode)
+            parsed = list(linter.parse(cp.stdout + cp.stderr, resolve))
+            if cp.returncode != 0 and not parsed:
+                # The tool itself failed (bad config, crash); nothing to keep
+                failed.update(file_of[p] for p in chunk)
+            for f, line in parsed:
+                warnings[f].append(line)
+    else:
+        return None
+    return warnings, records, skipped, failed
+
+def _lint_group(linter, group, root, cache=None, deadline=None):
+    """
+    Lint the files of one linter (through the cache) into a LintResult.
+    """
+    result = LintResult()
+    start = time.perf_counter()
+    keys, pending = {}, []
+    configs = config_hashes(root, group) if cache else {}
+    for f in group:
+        hit = None
+        if cache and (sha := file_blob_sha(root / f)):
+            keys[f] = cache.key(linter.tool, configs[f], sha)
+            hit = cache.get(keys[f])
+        if hit is None:
+            pending.append(f)
+            continue
+        result.warnings[f].extend(hit["warnings"])
+        result.records[f].extend(Violation(*r) for r in hit["records"])
+
+    if pending and deadline and not deadline.allows("lint"):
+        ran = ({}, {}, dict.fromkeys(pending, "deadline reached"), set())
+    elif pending:
+        timeout = deadline.timeout_for(linter.tool) if deadline else None
+        ran = _run_linter(linter, pending, root, timeout)
+    else:
+        ran = ({}, {}, {}, set())
+    if ran is None:
+        return result
+    warnings, records, skipped, failed = ran
+    result.skipped.update(skipped)
+    for f in pending:
+        result.warnings[f].extend(warnings.get(f, []))
+        result.records[f].extend(records.get(f, []))
+        if f in keys and f not in skipped and f not in failed:
+            cache.put(keys[f], {
+                "warnings": warnings.get(f, []),
+                "records": [[v.row, v.col, v.code, v.text] for v in records.get(f, [])],
+            })
+    result.timings[linter.tool] = time.perf_counter() - start
+    for f in group:
+        result.linted[f] = linter
+    return result
+
+def run_lint_stage(files, root, languages=None, cache=None, deadline=None, workers=1):
+    """
+    Lint all files with one invocation per tool (chunked only when the
+    command line would get too long) and split the output back per file.
+
+    With a ResultCache, files whose content and linter config were linted
+    before are answered from the cache and only the rest are run. With a
+    Deadline, tools are run under their timeouts and not started at all
+    once the lint stage has been given up; those files are marked skipped.
+    With workers > 1 the tools run at the same time.
+    """
+    root = Path(root)
+    by_linter = defaultdict(list)
+    for f in files:
+        linter = linter_for(f)
+        if not (root / f).is_file():
+            continue
+        if linter and (languages is None or linter.key in languages):
+            by_linter[linter].append(f)
+    groups = [
+        (linter, group) for linter, group in by_linter.items()
+        if linter.in_process or shutil.which(linter.tool)
+    ]
+
+    result = LintResult()
+    if workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(min(workers, len(groups))) as pool:
+            parts = list(pool.map(lambda g: _lint_group(*g, root, cache, deadline), groups))
+    else:
+        parts = (_lint_group(linter, group, root, cache, deadline) for linter, group in groups)
+    for part in parts:
+        result.merge(part)
+    return result
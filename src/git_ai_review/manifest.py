@@ -0,0 +1,96 @@
+import hashlib
+import json
+from pathlib import Path
+
+MANIFEST_VERSION = 2
+
+def manifest_path(out_file):
+    """
+    The manifest lives next to the review it describes.
+    """
+    return Path(f"{out_file}.manifest.json")
+
+def section_key(*inputs):
+    """
+    Hash everything a file section is rendered from (blob SHAs, summary,
+    tool versions, options) into one key.
+    """
+    return hashlib.sha256(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+class Manifest:
+    """
+    Records where each file section sits in a rendered review and what it
+    was rendered from, so a later run can copy unchanged sections verbatim.
+    """
+
+    def __init__(self, src, dst, out_file):
+        self.src = src
+        self.dst = dst
+        self.out_file = Path(out_file)
+        self.sections = {}
+        self.size = 0
+        self._fh = None
+
+    def add(self, path, key, offset, length, level=None, lint_count=0):
+        self.sections[path] = [key, offset, length, level, lint_count]
+
+    def level(self, path):
+        """
+        The detail level and lint finding count a section was rendered with.
+        """
+        entry = self.sections[path]
+        return entry[3], entry[4]
+
+    def save(self, size):
+        self.size = size
+        manifest_path(self.out_file).write_text(json.dumps({
+            "version": MANIFEST_VERSION,
+            "src": self.src,
+            "dst": self.dst,
+            "size": self.size,
+            "sections": self.sections,
+        }), encoding="utf-8")
+
+    @classmethod
+    def load(cls, out_file):
+        """
+        Return the manifest saved for out_file, or None if there is no usable
+        one (missing, other format, or the review was changed since).
+        """
+        try:
+            data = json.loads(manifest_path(out_file).read_text(encoding="utf-8"))
+            if data.get("version") != MANIFEST_VERSION:
+                return None
+            if Path(out_file).stat().st_size != data["size"]:
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+        manifest = cls(data["src"], data["dst"], out_file)
+        manifest.sections = data["sections"]
+        manifest.size = data["size"]
+        return manifest
+
+    def reuse(self, keys):
+        """
+        Return the paths whose section key still matches, so their text can
+        be read back with read().
+        """
+        return {
+            path for path, entry in self.sections.items()
+            if keys.get(path) == entry[0]
+        }
+
+    def read(self, path):
+        """
+        Read one section's text back from the previous review.
+        """
+        if self._fh is None:
+            self._fh = self.out_file.open("rb")
+        _, offset, length = self.sections[path][:3]
+        self._fh.seek(offset)
+        return self._fh.read(length).decode("utf-8")
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -0,0 +1,311 @@
+"""
+In-process code metrics for Python (via `ast`) and for JavaScript, C# and
+Dart (via a small brace-language tokenizer).
+
+Every measured blob becomes one row of per-file numbers, cached by blob
+SHA. Rows are gathered into columnar arrays (one array per metric, for the
+old and the new side of all changed files), so deltas and percentiles
+against the rest of the repository are computed a column at a time.
+"""
+import ast
+import bisect
+import re
+import subprocess
+from array import array
+from pathlib import PurePosixPath
+
+from git_ai_review.cache import BUILTIN_TOOLS
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.profiler import span
+
+ENGINE = "code-metrics"
+ENGINE_VERSION = "1"
+BUILTIN_TOOLS[ENGINE] = ENGINE_VERSION
+
+LANGUAGES = {".py": "py", ".js": "js", ".jsx": "js", ".ts": "js", ".tsx": "js", ".cs": "cs", ".dart": "dart"}
+
+# Per-file metrics, in row order
+COLUMNS = ("loc", "functions", "complexity", "max_complexity", "max_depth", "max_function_length")
+
+# Files sampled per language for the repository-wide percentiles
+DEFAULT_POPULATION = 500
+
+_NULL_SHA = "0" * 40
+
+def language_of(path):
+    return LANGUAGES.get(PurePosixPath(path).suffix.lower())
+
+def _row(loc, functions):
+    """
+    Per-file row from the LOC and a list of (complexity, depth, length)
+    per function.
+    """
+    return [
+        loc,
+        len(functions),
+        sum(f[0] for f in functions),
+        max((f[0] for f in functions), default=0),
+        max((f[1] for f in functions), default=0),
+        max((f[2] for f in functions), default=0),
+    ]
+
+# --- Python ---
+
+_PY_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef)
+_PY_BLOCKS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try, ast.Match)
+_PY_BRANCHES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.match_case)
+if hasattr(ast, "TryStar"):
+    _PY_BLOCKS += (ast.TryStar,)
+
+def python_metrics(source):
+    """
+    Row for a Python module, or None if it does not parse. Lambdas count
+    towards the function they appear in; nested functions are measured on
+    their own.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    text = source.decode("utf-8", errors="replace") if isinstance(source, bytes) else source
+    loc = sum(1 for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#"))
+    functions = []
+
+    def measure(fn):
+        complexity, max_depth = 1, 0
+        stack = [(child, 0) for child in ast.iter_child_nodes(fn)]
+        while stack:
+            node, depth = stack.pop()
+            if isinstance(node, _PY_DEFS):
+                measure(node)
+                continue
+            if isinstance(node, _PY_BRANCHES):
+                complexity += 1
+            elif isinstance(node, ast.BoolOp):
+                complexity += len(node.values) - 1
+            elif isinstance(node, ast.comprehension):
+                complexity += 1 + len(node.ifs)
+            if isinstance(node, _PY_BLOCKS):
+                depth += 1
+                max_depth = max(max_depth, depth)
+            stack.extend((child, depth) for child in ast.iter_child_nodes(node))
+        length = (fn.end_lineno or fn.lineno) - fn.lineno + 1
+        functions.append((complexity, max_depth, length))
+
+    stack = [tree]
+    while stack:
+        for child in ast.iter_child_nodes(stack.pop()):
+            if isinstance(child, _PY_DEFS):
+                measure(child)
+            else:
+                stack.append(child)
+    return _row(loc, functions)
+
+# --- JavaScript, C#, Dart ---
+
+_STRIP = re.compile(
+    r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|//[^\n]*|/\*[\s\S]*?\*/'
+    r'|@"(?:""|[^"])*"|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+)
+_TOKEN = re.compile(r"[A-Za-z_$][\w$]*|&&|\|\||\?\?=?|\?\.|\?\[|=>|[{}()?\n]")
+_BRANCH_WORDS = {"if", "for", "foreach", "while", "case", "catch"}
+_CONTROL = {"if", "for", "foreach", "while", "switch", "catch", "using", "lock", "fixed", "when", "return"}
+_ACCESSORS = {"get", "set", "init", "add", "remove"}
+
+def _blank(match):
+    # Keep line numbers: a stripped comment or string leaves its newlines
+    return "\n" * match.group(0).count("\n") + " "
+
+def brace_metrics(source):
+    """
+    Row for a JavaScript, C# or Dart file. Functions are the brace blocks
+    opened after a parameter list, an arrow or a property accessor.
+    """
+    text = source.decode("utf-8", errors="replace") if isinstance(source, bytes) else source
+    text = _STRIP.sub(_blank, text)
+    loc = sum(1 for line in text.splitlines() if line.strip())
+    functions = []
+    # Open blocks: a function record, or None for any other block; records
+    # are [complexity, base depth, max depth, start line]
+    blocks = []
+    current = []
+    # For each open "(": the two tokens before it, so a block after the
+    # matching ")" can tell `if (...) {` and `new Foo() {` from a function
+    parens = []
+    line, prev, before, owner = 1, None, None, (None, None)
+    for m in _TOKEN.finditer(text):
+        tok = m.group(0)
+        if tok == "\n":
+            line += 1
+            continue
+        if tok == "(":
+            parens.append((prev, before))
+        elif tok == ")":
+            owner = parens.pop() if parens else (None, None)
+        elif tok == "{":
+            after_params = owner[0] not in _CONTROL and owner[1] != "new"
+            is_fn = (
+                (prev in (")", "async") and after_params)
+                or prev == "=>"
+                or (prev in _ACCESSORS and blocks)
+            )
+            if is_fn:
+                record = [1, len(blocks), 0, line]
+                current.append(record)
+                blocks.append(record)
+            else:
+                blocks.append(None)
+                if current:
+                    fn = current[-1]
+                    fn[2] = max(fn[2], len(blocks) - 1 - fn[1])
+        elif tok == "}":
+            if blocks:
+                record = blocks.pop()
+                if record is not None:
+                    current.pop()
+                    functions.append((record[0], record[2], line - record[3] + 1))
+        elif current and (tok in _BRANCH_WORDS or tok in ("&&", "||")):
+            current[-1][0] += 1
+        elif current and tok == "?" and text[m.start() - 1] in " \t\n)":
+            # A ternary; `int? x` (no space before "?") is a nullable type
+            current[-1][0] += 1
+        before, prev = prev, tok
+    return _row(loc, functions)
+
+def file_metrics(path, source):
+    lang = language_of(path)
+    if lang == "py":
+        return python_metrics(source)
+    if lang:
+        return brace_metrics(source)
+    return None
+
+# --- Columnar tables ---
+
+def _blob_rows(objects, items, cache):
+    """
+    Rows for (path, blob sha) pairs, through the cache; None where the blob
+    is missing or does not parse.
+    """
+    rows = []
+    for path, sha in items:
+        if sha == _NULL_SHA:
+            rows.append(None)
+            continue
+
+        def compute(path=path, sha=sha):
+            try:
+                return file_metrics(path, objects.blob(sha))
+            except GitObjectError:
+                return None
+
+        lang = language_of(path)
+        rows.append(cache.cached(ENGINE, (sha,), compute, lang) if cache else compute())
+    return rows
+
+def _columns(rows):
+    return {c: array("l", (r[i] if r else 0 for r in rows)) for i, c in enumerate(COLUMNS)}
+
+def population(objects, ref, repo_path, cache=None, limit=DEFAULT_POPULATION):
+    """
+    {language: sorted array of max complexity} over the source files at ref,
+    from one `git ls-tree`. At most limit files per language are measured,
+    picked by blob SHA so the sample is stable between runs. With a
+    ResultCache the whole table is cached by ref's tree SHA.
+    """
+    def compute():
+        args = ["git", "ls-tree", "-r", "-z", ref]
+        with span("git", "git ls-tree", cmd=args) as s:
+            cp = subprocess.run(args, cwd=str(repo_path), capture_output=True)
+            s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+        if cp.returncode != 0:
+            return None
+        by_lang = {}
+        for entry in cp.stdout.decode("utf-8", errors="replace").split("\0"):
+            meta, _, path = entry.partition("\t")
+            parts = meta.split(" ")
+            if len(parts) != 3 or parts[1] != "blob":
+                continue
+            lang = language_of(path)
+            if lang:
+                by_lang.setdefault(lang, []).append((parts[2], path))
+        table = {}
+        for lang, blobs in by_lang.items():
+            sample = sorted(blobs)[:limit]
+            rows = _blob_rows(objects, [(path, sha) for sha, path in sample], cache)
+            table[lang] = sorted(_columns([r for r in rows if r])["max_complexity"])
+        return table
+
+    if cache is None:
+        table = compute()
+    else:
+        try:
+            tree_sha = objects.info(f"{ref}^{{tree}}")[0]
+        except GitObjectError:
+            tree_sha = None
+        table = cache.cached(ENGINE, (tree_sha,), compute, f"population-{limit}")
+    return {lang: array("l", column) for lang, column in (table or {}).items()}
+
+class MetricsTable:
+    """
+    Old and new metrics of the changed files, one array per column and side.
+    """
+
+    def __init__(self, paths, old_rows, new_rows, percentiles=None):
+        self.paths = list(paths)
+        self.present = [(o is not None, n is not None) for o, n in zip(old_rows, new_rows)]
+        self.old = _columns(old_rows)
+        self.new = _columns(new_rows)
+        self.delta = {c: array("l", (n - o for o, n in zip(self.old[c], self.new[c]))) for c in COLUMNS}
+        self.percentiles = percentiles or {}
+
+    def percentile(self, i):
+        """
+        Where the new max complexity of file i falls among its language's
+        files at the destination ref (0-100), or None.
+        """
+        column = self.percentiles.get(language_of(self.paths[i]))
+        if not column or not self.present[i][1]:
+            return None
+        return round(100 * bisect.bisect_right(column, self.new["max_complexity"][i]) / len(column))
+
+    def render(self):
+        """
+        Markdown table with one row per file: each metric at the destination
+        with its change, and the complexity percentile.
+        """
+        lines = [
+            "| File | LOC | Functions | Complexity | Max CC | Max depth | Longest fn | CC pctl |",
+            "|---|---|---|---|---|---|---|---|",
+        ]
+        for i, path in enumerate(self.paths):
+            had, has = self.present[i]
+            if not has:
+                lines.append(f"| {path} | deleted | | | | | | |")
+                continue
+            cells = []
+            for c in COLUMNS:
+                value, delta = self.new[c][i], self.delta[c][i]
+                cells.append(f"{value} ({delta:+d})" if had and delta else str(value))
+            pct = self.percentile(i)
+            status = "" if had else " (new)"
+            lines.append(f"| {path}{status} | {' | '.join(cells)} | {'' if pct is None else f'p{pct}'} |")
+        return "\n".join(lines) + "\n"
+
+def metrics_table(objects, changes, ref, repo_path, cache=None, languages=None, population_limit=DEFAULT_POPULATION):
+    """
+    Measure both sides of every changed source file (BlobChanges from
+    blob_index) and return a MetricsTable, or None if none was measured.
+    languages limits the table to some of "py", "js", "cs" and "dart".
+    """
+    items = [
+        c for c in changes
+        if language_of(c.path) and (languages is None or language_of(c.path) in languages)
+    ]
+    if not items:
+        return None
+    with span("engine", ENGINE, files=len(items)):
+        old_rows = _blob_rows(objects, [(c.old_path, c.old_sha) for c in items], cache)
+        new_rows = _blob_rows(objects, [(c.path, c.new_sha) for c in items], cache)
+        percentiles = population(objects, ref, repo_path, cache, population_limit) if population_limit else None
+    return MetricsTable([c.path for c in items], old_rows, new_rows, percentiles)
@@ -0,0 +1,98 @@
+import math
+import re
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+from git_ai_review.chunker import estimate_tokens
+
+# Detail levels a file section can be rendered at, most detailed first
+FULL, CONTEXT, STATS = "full", "u3", "stats"
+# Files the classifier keeps out of the pipeline; never planned or trimmed
+SKIPPED = "skipped"
+
+# Rough per-line costs used before anything is rendered
+TOKENS_PER_DIFF_LINE = 8
+TOKENS_PER_LINT_LINE = 12
+FUNCTION_CONTEXT_FACTOR = 4
+SECTION_OVERHEAD = 20
+
+_CODE = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".cs", ".dart", ".java", ".kt",
+    ".go", ".rs", ".c", ".cc", ".cpp", ".h", ".hpp", ".rb", ".php", ".swift",
+    ".razor", ".cshtml", ".sql", ".sh",
+}
+_CONFIG = {
+    ".json", ".yml", ".yaml", ".toml", ".xml", ".csproj", ".props", ".ini",
+    ".cfg", ".html", ".css", ".scss",
+}
+_DOCS = {".md", ".rst", ".txt"}
+
+_TEST = re.compile(r"(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$|Tests?\.cs$")
+_GENERATED = re.compile(
+    r"\.(g|freezed|mocks)\.dart$|\.Designer\.cs$|\.min\.(js|css)$|\.pb\.go$|_pb2\.py$"
+    r"|(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|pubspec\.lock|poetry\.lock|packages\.lock\.json)$"
+)
+
+def is_test_path(path):
+    return bool(_TEST.search(path))
+
+def is_generated_path(path):
+    return bool(_GENERATED.search(path))
+
+@dataclass
+class SectionPlan:
+    """
+    Planning data for one file section, taken from numstat and lint counts.
+    """
+    path: str
+    added: int
+    deleted: int
+    binary: bool = False
+    lint_count: int = 0
+    level: str = FULL
+
+    @property
+    def score(self):
+        """
+        How much the file matters to a reviewer; higher survives trimming.
+        """
+        ext = PurePosixPath(self.path).suffix.lower()
+        weight = 1.0 if ext in _CODE else 0.6 if ext in _CONFIG else 0.4 if ext in _DOCS else 0.5
+        if is_test_path(self.path):
+            weight *= 0.5
+        if is_generated_path(self.path):
+            weight *= 0.1
+        churn = self.added + self.deleted
+        return weight * (1 + math.log1p(churn)) + 0.5 * math.log1p(self.lint_count)
+
+    def cost(self, level=None):
+        """
+        Estimated tokens of the rendered section at a detail level.
+        """
+        level = level or self.level
+        base = SECTION_OVERHEAD + TOKENS_PER_LINT_LINE * max(self.lint_count, 1)
+        if level == STATS or self.binary:
+            return base
+        lines = self.added + self.deleted
+        if level == FULL:
+            return base + TOKENS_PER_DIFF_LINE * (lines * FUNCTION_CONTEXT_FACTOR + 5)
+        return base + TOKENS_PER_DIFF_LINE * (lines + 6 + 6 * math.ceil(lines / 20))
+
+def plan_sections(plans, fixed_text, max_tokens, estimator=estimate_tokens):
+    """
+    Choose a detail level for every SectionPlan so the review fits max_tokens.
+
+    Starting from full function context everywhere, the lowest-ranked files
+    are first reduced to -U3 diffs, then to stats only, until the estimate
+    fits (or nothing is left to trim). Returns the total estimated tokens.
+    """
+    total = sum(estimator(t) for t in fixed_text) + sum(p.cost() for p in plans)
+    by_rank = sorted(plans, key=lambda p: (p.score, p.path))
+    for frm, to in ((FULL, CONTEXT), (CONTEXT, STATS)):
+        for p in by_rank:
+            if total <= max_tokens:
+                return total
+            if p.level == frm:
+                total -= p.cost() - p.cost(to)
+                p.level = to
+    return total
@@ -0,0 +1,169 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# The active Profiler, or None; span() is a no-op while it is None
+_profiler = None
+
+class Span:
+    """
+    One timed operation: a git or tool invocation, a lint batch, a write.
+    Use as a context manager; update() adds args such as bytes or exit code.
+    """
+    __slots__ = ("profiler", "cat", "name", "args", "tid", "start", "end")
+
+    def __init__(self, profiler, cat, name, args, tid=None):
+        self.profiler = profiler
+        self.cat = cat
+        self.name = name
+        self.args = args
+        self.tid = tid
+        self.start = self.end = 0
+
+    def __bool__(self):
+        return True
+
+    def __enter__(self):
+        if self.tid is None:
+            self.tid = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.end = time.perf_counter_ns()
+        if exc_type is not None and "exit_code" not in self.args:
+            self.args["error"] = exc_type.__name__
+        self.profiler.add(self)
+
+    def update(self, **args):
+        self.args.update(args)
+
+    def counted(self, chunks, key="bytes_out"):
+        """
+        Pass chunks (lines, bytes) through, adding their lengths to args[key].
+        """
+        self.args.setdefault(key, 0)
+        for chunk in chunks:
+            self.args[key] += len(chunk)
+            yield chunk
+
+    @property
+    def seconds(self):
+        return (self.end - self.start) / 1e9
+
+class _NullSpan:
+    """
+    Stand-in returned by span() when profiling is off: every method is a
+    no-op and it is falsy, so call sites can skip work only a profile needs.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def update(self, **args):
+        pass
+
+    def counted(self, chunks, key="bytes_out"):
+        return chunks
+
+_NULL_SPAN = _NullSpan()
+
+def span(cat, name, tid=None, **args):
+    """
+    Return a Span for the active profiler, or a shared no-op span.
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return Span(_profiler, cat, name, args, tid)
+
+class Profiler:
+    """
+    Collect spans from all threads and export them as a Chrome trace.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def add(self, s):
+        with self._lock:
+            self.spans.append(s)
+
+    def trace_events(self):
+        """
+        Return the spans as Chrome trace "complete" events (microseconds),
+        which chrome://tracing and Perfetto both load.
+        """
+        pid = os.getpid()
+        events = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            events.append({
+                "name": s.name,
+                "cat": s.cat,
+                "ph": "X",
+                "ts": (s.start - self.origin) / 1000,
+                "dur": (s.end - s.start) / 1000,
+                "pid": pid,
+                "tid": s.tid,
+                "args": s.args,
+            })
+        return events
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, fh, default=str)
+
+    def summary(self, top=5):
+        """
+        Return a short table of the slowest tools and files.
+        """
+        tools = defaultdict(lambda: [0, 0.0, 0.0])
+        files = defaultdict(float)
+        for s in self.spans:
+            t = tools[(s.cat, s.name)]
+            t[0] += 1
+            t[1] += s.seconds
+            t[2] = max(t[2], s.seconds)
+            if "file" in s.args:
+                files[s.args["file"]] += s.seconds
+
+        lines = [f"{'Tool':<32} {'calls':>6} {'total s':>9} {'max s':>8}"]
+        for (cat, name), (calls, total, longest) in sorted(tools.items(), key=lambda kv: -kv[1][1])[:top]:
+            lines.append(f"{cat + ': ' + name:<32.32} {calls:>6} {total:>9.3f} {longest:>8.3f}")
+        if files:
+            lines.append(f"{'File':<48} {'total s':>9}")
+            for f, total in sorted(files.items(), key=lambda kv: -kv[1])[:top]:
+                lines.append(f"{f:<48.48} {total:>9.3f}")
+        return "\n".join(lines)
+
+def start_profiling():
+    """
+    Start recording spans process-wide and return the Profiler.
+    """
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def stop_profiling(trace_file):
+    """
+    Stop recording, write the Chrome trace to trace_file and print the
+    summary table to stderr.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    profiler.write_chrome_trace(trace_file)
+    print(f"\nProfile: {len(profiler.spans)} spans written to {trace_file}", file=sys.stderr)
+    print(profiler.summary(), file=sys.stderr)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import subprocess
+
+from git_ai_review.cache import BUILTIN_TOOLS
+from git_ai_review.profiler import span
+
+ENGINE = "project-tree"
+ENGINE_VERSION = "1"
+BUILTIN_TOOLS[ENGINE] = ENGINE_VERSION
+
+# Directories with more direct entries than this, or deeper than the depth
+# limit, are shown as a file count
+DEFAULT_FOLD_ABOVE = 100
+DEFAULT_MAX_DEPTH = 4
+
+class Node:
+    """
+    One directory of the trie: child directories by name and file names.
+    """
+    __slots__ = ("dirs", "files", "_count")
+
+    def __init__(self):
+        self.dirs = {}
+        self.files = []
+        self._count = None
+
+    @property
+    def count(self):
+        """
+        Number of files below this directory, computed on first use.
+        """
+        if self._count is None:
+            self._count = len(self.files) + sum(d.count for d in self.dirs.values())
+        return self._count
+
+def list_tree(ref, repo_path, timeout=None):
+    """
+    Return every file path in the tree of ref, from one `git ls-tree -r`,
+    or None if git failed or timed out.
+    """
+    args = ["git", "ls-tree", "-r", "-z", "--name-only", ref]
+    with span("git", "git ls-tree", cmd=args) as s:
+        try:
+            cp = subprocess.run(args, cwd=str(repo_path), capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            s.update(error="timeout")
+            return None
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    if cp.returncode != 0:
+        return None
+    return [p for p in cp.stdout.decode("utf-8", errors="replace").split("\0") if p]
+
+def _dir_node(nodes, path):
+    parent, _, name = path.rpartition("/")
+    parent_node = nodes.get(parent) or _dir_node(nodes, parent)
+    node = nodes[path] = parent_node.dirs[name] = Node()
+    return node
+
+def build_trie(paths):
+    """
+    Build the directory trie; sibling files share one dict lookup for
+    their directory, so sorted `ls-tree` output is cheap to load.
+    """
+    root = Node()
+    nodes = {"": root}
+    for p in paths:
+        d, _, name = p.rpartition("/")
+        node = nodes.get(d) or _dir_node(nodes, d)
+        node.files.append(name)
+    return root
+
+def _ancestors(paths):
+    dirs = set()
+    for p in paths:
+        parts = p.split("/")[:-1]
+        for i in range(1, len(parts) + 1):
+            dirs.add("/".join(parts[:i]))
+    return dirs
+
+def render_tree(root, max_depth=DEFAULT_MAX_DEPTH, fold_above=DEFAULT_FOLD_ABOVE, changed=None):
+    """
+    Render the trie as an indented listing.
+
+    Directories deeper than max_depth, or with more than fold_above direct
+    entries, are shown as "name/ (N files)". With changed (a set of paths)
+    only those files and their ancestor directories are listed; whatever
+    else a directory holds is summarised as one "... (+N more)" line.
+    """
+    keep_dirs = _ancestors(changed) if changed is not None else None
+    lines = []
+
+    def summary(node):
+        return f"({node.count} file{'s' if node.count != 1 else ''})"
+
+    def walk(node, prefix, depth):
+        indent = "  " * depth
+        files = sorted(node.files)
+        dirs = sorted(node.dirs)
+        hidden = 0
+        if keep_dirs is not None:
+            shown_files = [f for f in files if f"{prefix}{f}" in changed]
+            shown_dirs = [d for d in dirs if f"{prefix}{d}" in keep_dirs]
+            hidden = len(files) + len(dirs) - len(shown_files) - len(shown_dirs)
+            files, dirs = shown_files, shown_dirs
+        if depth == 0 and files:
+            # Files at the top level are listed under "./", like the old tree
+            lines.append("./")
+            lines.extend(f"  {f}" for f in files)
+        else:
+            lines.extend(f"{indent}{f}" for f in files)
+        for d in dirs:
+            child = node.dirs[d]
+            path = f"{prefix}{d}"
+            too_deep = max_depth is not None and depth + 1 >= max_depth
+            too_wide = (
+                fold_above is not None and len(child.dirs) + len(child.files) > fold_above
+                and (keep_dirs is None or path not in keep_dirs)
+            )
+            if too_deep or too_wide:
+                lines.append(f"{indent}{d}/ {summary(child)}")
+            else:
+                lines.append(f"{indent}{d}/")
+                walk(child, f"{path}/", depth + 1)
+        if hidden:
+            lines.append(f"{indent}... (+{hidden} more)")
+
+    walk(root, "", 0)
+    return "\n".join(lines)
+
+def project_tree(ref, repo_path, max_depth=DEFAULT_MAX_DEPTH, fold_above=DEFAULT_FOLD_ABOVE,
+                 changed=None, cache=None, tree_sha=None, timeout=None):
+    """
+    Return a Markdown code block with the tracked files of ref as a tree
+    (see render_tree). With a ResultCache the rendering is cached by the
+    ref's tree SHA and the options, so an unchanged tree costs one lookup.
+    """
+    # A failed listing yields None, which the cache does not store
+    def compute():
+        paths = list_tree(ref, repo_path, timeout)
+        if paths is None:
+            return None
+        if not paths:
+            return "```\n(empty or no tracked files)\n```"
+        changed_set = set(changed) if changed is not None else None
+        tree = render_tree(build_trie(paths), max_depth, fold_above, changed_set)
+        return f"```\n{tree}\n```"
+
+    unavailable = "```\n(project tree not available)\n```"
+    if cache is None:
+        return compute() or unavailable
+    if tree_sha is None:
+        cp = subprocess.run(
+            ["git", "rev-parse", f"{ref}^{{tree}}"],
+            cwd=str(repo_path), capture_output=True, text=True
+        )
+        tree_sha = cp.stdout.strip() if cp.returncode == 0 else None
+    options = json.dumps([max_depth, fold_above, sorted(changed) if changed is not None else None])
+    return cache.cached(
+        ENGINE, (tree_sha,), compute,
+        hashlib.sha256(options.encode("utf-8")).hexdigest()
+    ) or unavailable
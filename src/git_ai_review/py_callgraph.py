@@ -0,0 +1,289 @@
+"""
+In-process call graph of the changed Python modules and their importers.
+
+Each module blob is reduced to a small JSON summary (definitions with
+line ranges, imports, and the dotted names each function calls) that is
+cached by blob SHA, so a module is parsed once however many reviews see it.
+The summaries are then linked through one symbol table, which resolves
+calls across module boundaries.
+"""
+import ast
+import json
+import re
+import subprocess
+
+from git_ai_review.cache import BUILTIN_TOOLS
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.profiler import span
+
+ENGINE = "py-callgraph"
+ENGINE_VERSION = "1"
+BUILTIN_TOOLS[ENGINE] = ENGINE_VERSION
+
+# Pseudo-function holding the calls made at module level
+MODULE_SCOPE = "<module>"
+
+def module_name(path):
+    """
+    Dotted module name of a repository path ("pkg/mod.py" -> "pkg.mod").
+    """
+    parts = path[:-3].split("/") if path.endswith(".py") else path.split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+def absolute_module(path, module, level):
+    """
+    Resolve a (possibly relative) `from module import ...` in the file at path.
+    """
+    if not level:
+        return module
+    parts = module_name(path).split(".")
+    # Relative imports count from the package, which for __init__.py is
+    # the module itself
+    if not path.endswith("__init__.py"):
+        parts.pop()
+    base = parts[:len(parts) - level + 1] if level > 1 else parts
+    return ".".join([p for p in base if p] + ([module] if module else []))
+
+def _dotted(node):
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+def summarize_module(source):
+    """
+    Return the JSON-able summary of one module, or None if it does not
+    parse: {"defs": {qualname: [first, last line, kind]}, "imports":
+    [[alias, module, name, level]], "calls": {qualname: [dotted names]}}.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    defs, imports, calls = {}, [], {}
+
+    def visit(body, scope, in_class):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                q = f"{scope}.{node.name}" if scope else node.name
+                kind = "class" if isinstance(node, ast.ClassDef) else "method" if in_class else "function"
+                defs[q] = [node.lineno, node.end_lineno, kind]
+                for d in node.decorator_list:
+                    collect(d, scope or MODULE_SCOPE)
+                visit(node.body, q, kind == "class")
+            else:
+                collect(node, scope or MODULE_SCOPE)
+
+    def collect(node, caller):
+        # Walk one statement, stopping at nested definitions
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if isinstance(n, ast.Call):
+                name = _dotted(n.func)
+                if name:
+                    calls.setdefault(caller, []).append(name)
+            elif isinstance(n, ast.Import):
+                for a in n.names:
+                    alias = a.asname or a.name.split(".")[0]
+                    imports.append([alias, a.name if a.asname else alias, None, 0])
+            elif isinstance(n, ast.ImportFrom):
+                for a in n.names:
+                    if a.name != "*":
+                        imports.append([a.asname or a.name, n.module or "", a.name, n.level])
+            for child in ast.iter_child_nodes(n):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    visit([child], caller if caller != MODULE_SCOPE else "", False)
+                else:
+                    stack.append(child)
+
+    visit(tree.body, "", False)
+    return {
+        "defs": defs,
+        "imports": imports,
+        "calls": {q: sorted(set(names)) for q, names in calls.items()},
+    }
+
+def changed_lines(patch):
+    """
+    New-side line numbers touched by a FilePatch: added lines, and the
+    line a deletion sits in front of.
+    """
+    lines = set()
+    for hunk in patch.hunks if patch else ():
+        m = re.match(r"@@ -\d+(?:,\d+)? \+(\d+)", hunk.header)
+        if not m:
+            continue
+        n = int(m.group(1))
+        for line in hunk.lines:
+            if line.startswith("+"):
+                lines.add(n)
+                n += 1
+            elif line.startswith("-"):
+                lines.add(n)
+            elif not line.startswith("\\"):
+                n += 1
+    return lines
+
+def changed_functions(summary, lines):
+    """
+    Qualnames of the innermost functions and methods containing any of
+    the given lines.
+    """
+    changed = set()
+    for line in lines:
+        best = None
+        for q, (first, last, kind) in summary["defs"].items():
+            if kind != "class" and first <= line <= last and (best is None or first >= summary["defs"][best][0]):
+                best = q
+        if best:
+            changed.add(best)
+    return changed
+
+def find_importers(ref, paths, repo_path):
+    """
+    Return the .py files at ref, other than paths, that may import one of
+    the given module paths, from one `git grep`. Matches are confirmed
+    later from the parsed imports.
+    """
+    names = set()
+    for p in paths:
+        parts = module_name(p).split(".")
+        if parts and parts[-1]:
+            names.add(parts[-1])
+    if not names:
+        return []
+    pattern = r"^\s*(from|import)\s.*\b(" + "|".join(re.escape(n) for n in sorted(names)) + r")\b"
+    args = ["git", "grep", "-l", "-z", "-E", pattern, ref, "--", "*.py"]
+    with span("git", "git grep", cmd=args) as s:
+        cp = subprocess.run(args, cwd=str(repo_path), capture_output=True)
+        s.update(bytes_out=len(cp.stdout), exit_code=cp.returncode)
+    prefix = f"{ref}:"
+    found = []
+    for entry in cp.stdout.decode("utf-8", errors="replace").split("\0"):
+        path = entry[len(prefix):] if entry.startswith(prefix) else entry
+        if path and path not in paths:
+            found.append(path)
+    return found
+
+class CallGraph:
+    """
+    Caller -> callee edges between the functions of the summarised modules.
+    Nodes are fully qualified names ("pkg.mod.Class.method"); calls into
+    modules that were not summarised keep the name they were imported as.
+    """
+
+    def __init__(self, summaries):
+        self.summaries = summaries
+        self.modules = {path: module_name(path) for path in summaries}
+        self.edges = {}
+        self.callers = {}
+        self._by_suffix = {}
+        for path, summary in summaries.items():
+            mod = self.modules[path]
+            for q in summary["defs"]:
+                fq = f"{mod}.{q}" if mod else q
+                parts = fq.split(".")
+                for i in range(len(parts) - 1):
+                    self._by_suffix.setdefault(".".join(parts[i:]), fq)
+        for path, summary in summaries.items():
+            self._link(path, summary)
+
+    def _link(self, path, summary):
+        mod = self.modules[path]
+        imports = {}
+        for alias, module, name, level in summary["imports"]:
+            base = absolute_module(path, module, level)
+            imports[alias] = f"{base}.{name}" if base and name else name or base
+        defs = summary["defs"]
+        top = {q for q in defs if "." not in q}
+        for caller, names in summary["calls"].items():
+            fq_caller = f"{mod}.{caller}" if mod else caller
+            for name in names:
+                callee = self._resolve(mod, caller, name, defs, top, imports)
+                if callee and callee != fq_caller:
+                    self.edges.setdefault(fq_caller, set()).add(callee)
+                    self.callers.setdefault(callee, set()).add(fq_caller)
+
+    def _resolve(self, mod, caller, name, defs, top, imports):
+        head, _, rest = name.partition(".")
+        prefix = f"{mod}." if mod else ""
+        if head in ("self", "cls") and rest:
+            owner = caller.rsplit(".", 1)[0] if "." in caller else None
+            if owner and defs.get(owner, [0, 0, ""])[2] == "class":
+                candidate = f"{prefix}{owner}.{rest}"
+            else:
+                return None
+        elif head in top:
+            candidate = f"{prefix}{name}"
+        elif head in imports:
+            candidate = imports[head] + (f".{rest}" if rest else "")
+        else:
+            return None
+        fq = self._by_suffix.get(candidate)
+        if fq is None:
+            return candidate if head in imports else None
+        # Calling a class runs its constructor
+        init = f"{fq}.__init__"
+        return init if init in self._by_suffix else fq
+
+    def section(self, path, lines):
+        """
+        JSON for the review section of one changed file: callers and
+        callees of each function whose lines changed, or None if none of
+        them calls or is called by anything in the graph.
+        """
+        summary = self.summaries.get(path)
+        if summary is None:
+            return None
+        mod = self.modules[path]
+        graph = {}
+        for q in sorted(changed_functions(summary, lines)):
+            fq = f"{mod}.{q}" if mod else q
+            callers, callees = self.callers.get(fq), self.edges.get(fq)
+            if callers or callees:
+                graph[fq] = {"callers": sorted(callers or ()), "callees": sorted(callees or ())}
+        if not graph:
+            return None
+        return json.dumps(graph, indent=2) + "\n"
+
+def build_call_graph(objects, ref, paths, repo_path, cache=None):
+    """
+    Summarise the given .py paths at ref and their direct importers, and
+    link them into a CallGraph. Summaries are cached by blob SHA.
+    """
+    paths = set(paths)
+    candidates = sorted(paths) + find_importers(ref, paths, repo_path)
+    changed_modules = {module_name(p) for p in paths}
+    summaries = {}
+    for path in candidates:
+        try:
+            sha = objects.info(f"{ref}:{path}")[0]
+        except GitObjectError:
+            continue
+
+        def compute(sha=sha):
+            return summarize_module(objects.blob(sha))
+
+        summary = cache.cached(ENGINE, (sha,), compute) if cache else compute()
+        if summary is None:
+            continue
+        if path not in paths and not _imports_any(summary, path, changed_modules):
+            continue
+        summaries[path] = summary
+    return CallGraph(summaries)
+
+def _imports_any(summary, path, modules):
+    for _, module, name, level in summary["imports"]:
+        module = absolute_module(path, module, level)
+        targets = {module, f"{module}.{name}" if module and name else name or module}
+        for m in modules:
+            if any(t == m or t.endswith(f".{m}") or m.endswith(f".{t}") for t in targets if t):
+                return True
+    return False
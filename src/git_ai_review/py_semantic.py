@@ -0,0 +1,255 @@
+"""
+In-process semantic diff of two versions of a Python module.
+
+Both blobs are parsed with `ast` and every node gets a structural hash in
+one bottom-up pass, so comparing definitions (and finding where a moved or
+renamed one went) is a dict lookup instead of a tree comparison.
+"""
+import ast
+import bisect
+import functools
+from dataclasses import dataclass
+
+from git_ai_review.cache import BUILTIN_TOOLS
+
+ENGINE = "py-ast-diff"
+ENGINE_VERSION = "2"
+BUILTIN_TOOLS[ENGINE] = ENGINE_VERSION
+
+_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+@dataclass
+class Definition:
+    """
+    One function, method or class, with the hashes it is compared by.
+    The source form of the signature and decorators is only rendered for
+    definitions that end up in the report.
+    """
+    qualname: str
+    name: str
+    parent: str
+    kind: str
+    node: ast.AST
+    signature_hash: int
+    decorator_hash: int
+    body_hash: int
+    full_hash: int
+    order: int
+    index: int
+
+    @functools.cached_property
+    def signature(self):
+        return _signature(self.node)
+
+    @functools.cached_property
+    def decorators(self):
+        return tuple(f"@{ast.unparse(d)}" for d in self.node.decorator_list)
+
+    def describe(self):
+        if self.kind == "class":
+            return f"class {self.qualname}{self.signature}"
+        return f"{self.kind} {self.qualname}{self.signature}"
+
+def subtree_hashes(tree):
+    """
+    Return {id(node): hash} for every node, from one bottom-up pass over
+    the tree. Positions are ignored, so equal code hashes equally wherever
+    it sits in the file.
+    """
+    hashes = {}
+
+    def visit(node):
+        parts = [node.__class__.__name__]
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, ast.AST):
+                parts.append(visit(value))
+            elif isinstance(value, list):
+                parts.append(tuple([visit(v) if isinstance(v, ast.AST) else v for v in value]))
+            else:
+                # Keep 1 and True apart
+                parts.append((value.__class__, value))
+        h = hashes[id(node)] = hash(tuple(parts))
+        return h
+
+    visit(tree)
+    return hashes
+
+def _signature(node):
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        return f"({', '.join(bases)})" if bases else ""
+    sig = f"({ast.unparse(node.args)})"
+    if node.returns is not None:
+        sig += f" -> {ast.unparse(node.returns)}"
+    return sig
+
+def collect_definitions(source):
+    """
+    Return {qualname: Definition} for every def and class in source, in
+    file order. A redefined name (e.g. a property setter) gets a "#2"
+    suffix. Raises SyntaxError or ValueError if source does not parse, and
+    RecursionError if it nests too deeply to hash.
+    """
+    tree = ast.parse(source)
+    hashes = subtree_hashes(tree)
+    defs = {}
+
+    def visit(body, parent, parent_kind):
+        index = 0
+        for node in body:
+            if not isinstance(node, _DEFS):
+                continue
+            qualname = f"{parent}.{node.name}" if parent else node.name
+            n = 2
+            while qualname in defs:
+                qualname = f"{parent}.{node.name}#{n}" if parent else f"{node.name}#{n}"
+                n += 1
+            # Nested definitions are compared on their own, so they are
+            # left out of the enclosing body's hash
+            body_hash = hash(tuple(hashes[id(s)] for s in node.body if not isinstance(s, _DEFS)))
+            if isinstance(node, ast.ClassDef):
+                signature = tuple(hashes[id(n)] for n in node.bases + node.keywords)
+            else:
+                signature = (hashes[id(node.args)], hashes.get(id(node.returns)))
+            decorators = tuple(hashes[id(d)] for d in node.decorator_list)
+            kind = "class" if isinstance(node, ast.ClassDef) else "method" if parent_kind == "class" else "function"
+            if isinstance(node, ast.AsyncFunctionDef):
+                kind = f"async {kind}"
+            defs[qualname] = Definition(
+                qualname, node.name, parent, kind, node, hash(signature), hash(decorators), body_hash,
+                hash((node.__class__, signature, decorators, tuple(hashes[id(s)] for s in node.body))),
+                len(defs), index
+            )
+            index += 1
+            visit(node.body, qualname, kind)
+
+    visit(tree.body, "", None)
+    return defs
+
+def _longest_increasing(seq):
+    """
+    Return the set of positions in seq that form one longest increasing
+    subsequence (patience sorting, O(n log n)).
+    """
+    tails, tail_pos, prev = [], [], [None] * len(seq)
+    for i, v in enumerate(seq):
+        k = bisect.bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tail_pos.append(i)
+        else:
+            tails[k] = v
+            tail_pos[k] = i
+        prev[i] = tail_pos[k - 1] if k else None
+    keep = set()
+    i = tail_pos[-1] if tail_pos else None
+    while i is not None:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+def _trivial(node):
+    """
+    Whether a definition's body is a single stub statement (pass, ...,
+    return of a constant, a bare raise), which says nothing about where it
+    went: unrelated stubs hash alike.
+    """
+    if len(node.body) != 1:
+        return False
+    stmt = node.body[0]
+    if isinstance(stmt, ast.Pass):
+        return True
+    if isinstance(stmt, ast.Expr):
+        return isinstance(stmt.value, ast.Constant) and stmt.value.value is Ellipsis
+    if isinstance(stmt, ast.Return):
+        return stmt.value is None or isinstance(stmt.value, ast.Constant)
+    if isinstance(stmt, ast.Raise):
+        exc = stmt.exc.func if isinstance(stmt.exc, ast.Call) and not stmt.exc.args else stmt.exc
+        return exc is None or isinstance(exc, ast.Name)
+    return False
+
+def _subtree(defs, qualname):
+    prefix = qualname + "."
+    return [q for q in defs if q == qualname or q.startswith(prefix)]
+
+def semantic_diff(old_source, new_source):
+    """
+    Compare two versions of a module and return one line per added (+),
+    removed (-), modified (~) or moved/renamed (>) function, class or
+    method, or None if no definition changed. Sources may be bytes or str;
+    either may be empty (an added or deleted file).
+    """
+    try:
+        old = collect_definitions(old_source)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        return f"(old version does not parse: {e})\n"
+    try:
+        new = collect_definitions(new_source)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        return f"(new version does not parse: {e})\n"
+
+    removed = [q for q in old if q not in new]
+    added = {q for q in new if q not in old}
+    lines = []
+
+    # Match removed definitions to added ones with the same content, outer
+    # definitions first; whatever they contain moves along with them. Stub
+    # bodies only match a definition of the same name.
+    by_hash = {}
+    for q in new:
+        if q in added:
+            by_hash.setdefault(new[q].full_hash, []).append(q)
+    gone = set()
+    moved = {}
+    for q in removed:
+        if q in gone:
+            continue
+        d = old[q]
+        candidates = [c for c in by_hash.get(d.full_hash, ()) if c in added]
+        if _trivial(d.node):
+            candidates = [c for c in candidates if new[c].name == d.name]
+        if not candidates:
+            continue
+        target = next((c for c in candidates if new[c].name == d.name), candidates[0])
+        moved[target] = q
+        gone.update(_subtree(old, q))
+        added.difference_update(_subtree(new, target))
+    for q in removed:
+        if q not in gone:
+            lines.append((-1, old[q].order, f"- {old[q].describe()}"))
+    for target, q in moved.items():
+        how = "renamed" if new[target].parent == old[q].parent else "moved"
+        lines.append((new[target].order, 0, f"> {old[q].kind} {q} -> {target} ({how})"))
+    for q in added:
+        lines.append((new[q].order, 0, f"+ {new[q].describe()}"))
+
+    # Definitions kept under the same name: compare signature, decorators
+    # and own body, and flag those reordered among their siblings
+    siblings = {}
+    for q, d in new.items():
+        if q not in old:
+            continue
+        o = old[q]
+        changes = []
+        if o.kind != d.kind:
+            changes.append(f"{o.kind} -> {d.kind}")
+        if o.signature_hash != d.signature_hash:
+            changes.append(f"signature {o.signature or '()'} -> {d.signature or '()'}")
+        if o.decorator_hash != d.decorator_hash:
+            changes.append(f"decorators {' '.join(o.decorators) or 'none'} -> {' '.join(d.decorators) or 'none'}")
+        if o.body_hash != d.body_hash:
+            changes.append("body")
+        if changes:
+            lines.append((d.order, 1, f"~ {d.kind} {q}: {'; '.join(changes)}"))
+        siblings.setdefault(d.parent, []).append(q)
+    for names in siblings.values():
+        names.sort(key=lambda q: old[q].index)
+        keep = _longest_increasing([new[q].index for q in names])
+        for i, q in enumerate(names):
+            if i not in keep:
+                lines.append((new[q].order, 2, f"> {new[q].kind} {q} (reordered)"))
+
+    if not lines:
+        return None
+    return "".join(text + "\n" for _, _, text in sorted(lines))
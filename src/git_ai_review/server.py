@@ -0,0 +1,396 @@
+"""
+`generate-review serve`: a long-running review service.
+
+Jobs are JSON objects POSTed to /review over localhost HTTP or a Unix
+socket:
+
+  {"repo_path": "/src/app", "src": "origin/main", "dst": "feature/x",
+   "context": "...", "task": "...", "max_tokens": 60000, "stream": true}
+
+Jobs must be sent as `Content-Type: application/json`. "context"/"task"
+are given as text; over the Unix socket they may also be "context_file"/
+"task_file" paths, and "out_file" has the review written there on the
+server with a JSON status returned. Server-side paths are refused over TCP,
+where any local process (or web page) can reach the port. Otherwise the
+review is the response body, streamed section by section when "stream" is
+true; a streamed review that fails part way ends with a "[review failed:
+...]" line. GET /health reports queue and cache state.
+"""
+import argparse
+import io
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from git_ai_review.cache import ResultCache
+from git_ai_review.cli import generate_review
+from git_ai_review.deadline import Deadline
+from git_ai_review.git_wrapper import must_be_repo
+from git_ai_review.session import RepoSession
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE = 32
+
+class QueueFull(Exception):
+    pass
+
+class JobError(Exception):
+    """
+    A job that could not be run; status is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+# Job fields by type; repo_path, src and dst are required
+_STR_FIELDS = ("repo_path", "src", "dst", "context", "task", "context_file", "task_file", "out_file")
+_BOOL_FIELDS = ("snapshot", "incremental", "stream")
+_COUNT_FIELDS = ("max_tokens", "jobs")
+FILE_FIELDS = ("context_file", "task_file", "out_file")
+
+def validate_job(job):
+    """
+    Check a job's fields and their types, raising JobError on the first
+    problem.
+    """
+    known = set(_STR_FIELDS + _BOOL_FIELDS + _COUNT_FIELDS + ("deadline", "timeouts"))
+    unknown = sorted(set(job) - known)
+    if unknown:
+        raise JobError(f"Unknown job field: {unknown[0]}")
+    for field in ("repo_path", "src", "dst"):
+        if not job.get(field):
+            raise JobError(f"Missing job field: {field}")
+    for field in _STR_FIELDS:
+        if job.get(field) is not None and not isinstance(job[field], str):
+            raise JobError(f"Job field {field} must be a string")
+    for field in _BOOL_FIELDS:
+        if job.get(field) is not None and not isinstance(job[field], bool):
+            raise JobError(f"Job field {field} must be true or false")
+    for field in _COUNT_FIELDS:
+        value = job.get(field)
+        if value is not None and (type(value) is not int or value < 1):
+            raise JobError(f"Job field {field} must be a positive integer")
+    deadline = job.get("deadline")
+    if deadline is not None and (type(deadline) not in (int, float) or deadline <= 0):
+        raise JobError("Job field deadline must be a positive number of seconds")
+    timeouts = job.get("timeouts")
+    if timeouts is not None and not (
+        isinstance(timeouts, dict)
+        and all(k.strip() and type(v) in (int, float) and v > 0 for k, v in timeouts.items())
+    ):
+        raise JobError("Job field timeouts must map tool names to positive seconds")
+
+class ReviewService:
+    """
+    Runs review jobs on a bounded worker pool, keeping one RepoSession per
+    repository (object readers, root and remote) and one result cache warm
+    across jobs. At most workers + queue_size jobs are accepted at a time.
+    """
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE, cache=None):
+        self.workers = workers or min(os.cpu_count() or 1, 4)
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="review")
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.accepted = self.done = self.failed = 0
+
+    def session(self, repo_path):
+        """
+        Return the warm RepoSession for a repository, opening it on first use.
+        """
+        key = os.path.realpath(repo_path)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                try:
+                    must_be_repo(key)
+                except argparse.ArgumentTypeError as e:
+                    raise JobError(str(e))
+                session = self._sessions[key] = RepoSession(key)
+            return session
+
+    def submit(self, job, out):
+        """
+        Queue a job writing its review to out (a path or binary stream) and
+        return its Future. Raises JobError for a malformed job and QueueFull
+        when every slot is taken.
+        """
+        validate_job(job)
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull()
+        with self._lock:
+            self.accepted += 1
+        future = self.pool.submit(self._run, job, out)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        self._slots.release()
+        with self._lock:
+            if future.exception() is None:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def _run(self, job, out):
+        try:
+            self._generate(job, out)
+        except SystemExit as e:
+            raise JobError(str(e.code))
+        except (JobError, OSError):
+            raise
+        except Exception as e:
+            raise JobError(f"{type(e).__name__}: {e}", status=500)
+
+    def _generate(self, job, out):
+        session = self.session(job["repo_path"])
+        session.refresh()
+        with tempfile.TemporaryDirectory(prefix="git-ai-review-job-") as tmp:
+            ctx_file = _job_file(job, "context", Path(tmp) / "context.txt")
+            if ctx_file is None:
+                raise JobError("Missing job field: context or context_file")
+            task_file = _job_file(job, "task", Path(tmp) / "task.txt")
+            generate_review(
+                ctx_file, task_file, out, job["src"], job["dst"], session.root,
+                snapshot=bool(job.get("snapshot")),
+                cache=self.cache,
+                incremental=bool(job.get("incremental")),
+                max_tokens=job.get("max_tokens"),
+                deadline=Deadline(job.get("deadline"), job.get("timeouts")),
+                session=session,
+                jobs=job.get("jobs") or 1,
+                log=_job_log(f"{job['src']}..{job['dst']}")
+            )
+
+    def health(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "accepted": self.accepted,
+                "done": self.done,
+                "failed": self.failed,
+                "in_flight": self.accepted - self.done - self.failed,
+                "repos": sorted(self._sessions),
+                "cache": self.cache.stats() if self.cache else None,
+            }
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+def _job_log(label):
+    """
+    Progress logger for one job: each message goes to stderr as whole
+    lines tagged with label, so concurrent jobs do not interleave mid-line
+    (and never reach stdout).
+    """
+    def log(message=""):
+        lines = str(message).rstrip("\n").split("\n")
+        sys.stderr.write("".join(f"[{label}] {line}\n" for line in lines))
+    return log
+
+def _job_file(job, name, scratch):
+    """
+    Return the path of a job's context/task, writing inline text to scratch.
+    """
+    if job.get(name) is not None:
+        scratch.write_text(job[name], encoding="utf-8")
+        return scratch
+    if job.get(f"{name}_file"):
+        path = Path(job[f"{name}_file"])
+        if not path.is_file():
+            raise JobError(f"File not found: {path}")
+        return path
+    return None
+
+class _StreamedBody:
+    """
+    The response body of a streamed review. The 200 status and headers go
+    out with the first bytes, so a job that fails before writing anything
+    still gets a proper error status.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.started = False
+
+    def write(self, data):
+        if not self.started:
+            self.started = True
+            self.handler.send_response(200)
+            self.handler.send_header("Content-Type", "text/markdown; charset=utf-8")
+            self.handler.send_header("Connection", "close")
+            self.handler.end_headers()
+        self.handler.wfile.write(data)
+
+    def flush(self):
+        if self.started:
+            self.handler.wfile.flush()
+
+class ReviewHandler(BaseHTTPRequestHandler):
+    server_version = "git-ai-review"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._json(200, self.service.health())
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/review":
+            self._json(404, {"error": "not found"})
+            return
+        # Only JSON: a cross-site form or text/plain POST is refused before
+        # anything is read, and browsers preflight real JSON requests
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._json(415, {"error": "jobs must be sent as application/json"})
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+        except ValueError as e:
+            self._json(400, {"error": f"Bad job: {e}"})
+            return
+        if not self.server.local_files:
+            refused = [f for f in FILE_FIELDS if job.get(f) is not None]
+            if refused:
+                self._json(403, {"error": f"{refused[0]} is only accepted over the Unix socket"})
+                return
+
+        start = time.perf_counter()
+        if isinstance(job.get("out_file"), str) and job["out_file"]:
+            out = str(Path(job["out_file"]).resolve())
+        elif job.get("stream"):
+            out = _StreamedBody(self)
+        else:
+            out = io.BytesIO()
+        try:
+            future = self.service.submit(job, out)
+        except QueueFull:
+            self._json(503, {"error": "queue full"})
+            return
+        except JobError as e:
+            self._json(e.status, {"error": str(e)})
+            return
+
+        try:
+            future.result()
+        except (JobError, OSError) as e:
+            status = e.status if isinstance(e, JobError) else 500
+            if isinstance(out, _StreamedBody) and out.started:
+                # The 200 is already out: end the body with an error marker
+                self.wfile.write(f"\n[review failed: {e}]\n".encode("utf-8"))
+            else:
+                self._json(status, {"error": str(e)})
+            return
+        seconds = round(time.perf_counter() - start, 3)
+        if isinstance(out, str):
+            self._json(200, {"out_file": out, "seconds": seconds})
+        elif isinstance(out, io.BytesIO):
+            data = out.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/markdown; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Review-Seconds", str(seconds))
+            self.end_headers()
+            self.wfile.write(data)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(service, socket_path=None, host="127.0.0.1", port=DEFAULT_PORT):
+    """
+    Serve review jobs until interrupted.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = UnixHTTPServer(socket_path, ReviewHandler)
+        where = f"unix:{socket_path}"
+    else:
+        httpd = ThreadingHTTPServer((host, port), ReviewHandler)
+        where = f"http://{host}:{httpd.server_address[1]}"
+    # Only socket peers (guarded by its file permissions) may name files
+    httpd.local_files = bool(socket_path)
+    httpd.service = service
+    print(f"Serving reviews on {where} with {service.workers} workers", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="generate-review serve",
+        description="Serve review jobs over a Unix socket or localhost HTTP, keeping repositories warm"
+    )
+    parser.add_argument(
+        "--socket", type=str,
+        help="Listen on this Unix socket path instead of TCP"
+    )
+    parser.add_argument(
+        "--host", type=str, default="127.0.0.1",
+        help="TCP address to listen on (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT,
+        help=f"TCP port to listen on (default: {DEFAULT_PORT})"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int,
+        help="Reviews generated at once (default: CPU count, at most 4)"
+    )
+    parser.add_argument(
+        "--queue", type=int, default=DEFAULT_QUEUE,
+        help=f"Jobs accepted beyond the running ones before answering 503 (default: {DEFAULT_QUEUE})"
+    )
+    parser.add_argument(
+        "--cache-dir", type=str,
+        help="Result cache directory (default: ~/.cache/git-ai-review)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Do not read or write the result cache"
+    )
+    args = parser.parse_args(argv)
+    service = ReviewService(
+        args.workers, args.queue,
+        None if args.no_cache else ResultCache(args.cache_dir)
+    )
+    serve(service, args.socket, args.host, args.port)
@@ -0,0 +1,53 @@
+import subprocess
+from pathlib import Path
+
+from git_ai_review.git_objects import GitObjects
+
+class RepoSession:
+    """
+    Per-repository state a review needs before it looks at any ref: the
+    repository root, the origin remote and a GitObjects reader.
+
+    A one-off review builds and closes its own; `generate-review serve`
+    keeps one per repository warm across jobs.
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = Path(repo_path)
+        top = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=str(repo_path), capture_output=True, text=True, check=True
+        ).stdout.strip()
+        self.root = Path(top).resolve()
+        try:
+            self.remote_url = subprocess.run(
+                ["git", "remote", "get-url", "origin"],
+                cwd=str(repo_path), capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except subprocess.CalledProcessError:
+            self.remote_url = None
+        self.objects = GitObjects(repo_path)
+
+    @property
+    def remote_repo_name(self):
+        """
+        Repository name parsed from the origin URL (ssh or https form).
+        """
+        url = self.remote_url[:-4] if self.remote_url.endswith(".git") else self.remote_url
+        path = url.split(":", 1)[1] if url.startswith("git@") else url.split("/", 3)[-1]
+        return Path(path).name
+
+    def refresh(self):
+        """
+        Forget resolved refs so the next review sees where they point now.
+        """
+        self.objects.forget_refs()
+
+    def close(self):
+        self.objects.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
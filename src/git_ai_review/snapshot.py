@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path, PurePosixPath
+
+from git_ai_review.git_objects import GitObjectError
+from git_ai_review.lint import LINT_CONFIG_NAMES, LINT_CONFIG_SUFFIXES
+
+def _scratch_parent():
+    """
+    Prefer tmpfs for scratch trees when the platform has one.
+    """
+    shm = Path("/dev/shm")
+    return str(shm) if shm.is_dir() and os.access(shm, os.W_OK) else None
+
+def _config_paths(objects, ref, files):
+    """
+    Find linter config files in the directories that contain changed files
+    or are ancestors of them, reading one tree per directory.
+    """
+    dirs = {""}
+    for f in files:
+        dirs.update(str(p) for p in PurePosixPath(f).parents if str(p) != ".")
+    found = []
+    for d in sorted(dirs):
+        try:
+            entries = objects.tree(ref, d)
+        except GitObjectError:
+            continue
+        for e in entries:
+            if e.type == "blob" and (
+                e.name in LINT_CONFIG_NAMES or e.name.endswith(LINT_CONFIG_SUFFIXES)
+            ):
+                found.append(f"{d}/{e.name}" if d else e.name)
+    return found
+
+def tree_configs(objects, ref):
+    """
+    List the (name, blob sha) linter config files of a directory at ref,
+    for lint.config_hashes.
+    """
+    def configs(d):
+        try:
+            entries = objects.tree(ref, d)
+        except GitObjectError:
+            return []
+        return [
+            (e.name, e.sha) for e in sorted(entries, key=lambda e: e.name)
+            if e.type == "blob" and (e.name in LINT_CONFIG_NAMES or e.name.endswith(LINT_CONFIG_SUFFIXES))
+        ]
+    return configs
+
+class Snapshot:
+    """
+    A scratch directory holding only the changed files (and the linter
+    config around them) as they are at one ref, so analysis can run on that
+    ref without checking it out.
+    """
+
+    def __init__(self, objects, ref, files):
+        self.root = Path(tempfile.mkdtemp(prefix="git-ai-review-", dir=_scratch_parent()))
+        self.files = []
+        wanted = dict.fromkeys([*files, *_config_paths(objects, ref, files)])
+        for f in wanted:
+            data = objects.blob_at(ref, f)
+            if data is None:
+                continue
+            target = self.root / f
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+            self.files.append(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
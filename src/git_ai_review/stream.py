@@ -0,0 +1,134 @@
+"""
+Read a command's output while it is still running, in bounded memory.
+
+stdout is read from the pipe in fixed-size chunks and decoded incrementally,
+so a multi-byte character split between two chunks decodes correctly and
+invalid UTF-8 becomes U+FFFD. The output is handed out one line at a time;
+lines longer than max_line are cut short, so even a huge single-line file
+in a diff is never held in memory whole.
+"""
+import codecs
+import subprocess
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+class OutputStream:
+    """
+    A running command whose stdout is read as decoded lines, without their
+    line endings (a trailing "\\r" is dropped as well). Iterate it once;
+    returncode, stderr and timed_out are set when the output is exhausted.
+    With merge_stderr both streams are read as one, as with `2>&1`. A
+    command still running after timeout seconds is killed.
+    """
+
+    def __init__(self, args, cwd=None, timeout=None, merge_stderr=False, max_line=None):
+        self.args = args
+        self.max_line = max_line
+        self.returncode = None
+        self.stderr = ""
+        self.timed_out = False
+        self.bytes_read = 0
+        self.trailing_newline = False
+        self._eof = False
+        self._proc = subprocess.Popen(
+            args, cwd=cwd, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE
+        )
+        # stderr is drained on the side (keeping its tail) so a chatty
+        # command cannot block on a full pipe while stdout is read
+        self._stderr_tail = b""
+        self._stderr_reader = None
+        if not merge_stderr:
+            self._stderr_reader = threading.Thread(target=self._drain_stderr, daemon=True)
+            self._stderr_reader.start()
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _drain_stderr(self):
+        for chunk in iter(lambda: self._proc.stderr.read1(CHUNK_SIZE), b""):
+            self._stderr_tail = (self._stderr_tail + chunk)[-CHUNK_SIZE:]
+
+    def _expire(self):
+        self.timed_out = True
+        self._proc.kill()
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        read = self._proc.stdout.read1
+        # The line being assembled, and whether its tail is being dropped
+        pending, cut = "", False
+        try:
+            while True:
+                chunk = read(CHUNK_SIZE)
+                self.bytes_read += len(chunk)
+                parts = decoder.decode(chunk, not chunk).split("\n")
+                for i, part in enumerate(parts):
+                    if not cut:
+                        pending += part
+                        if self.max_line is not None and len(pending) > self.max_line:
+                            pending, cut = pending[:self.max_line], True
+                    if i < len(parts) - 1:
+                        yield pending[:-1] if pending.endswith("\r") else pending
+                        pending, cut = "", False
+                if not chunk:
+                    self._eof = True
+                    break
+            self.trailing_newline = self.bytes_read > 0 and not pending
+            if pending:
+                yield pending[:-1] if pending.endswith("\r") else pending
+        finally:
+            self.close()
+
+    def read(self, max_bytes=None):
+        """
+        Return the whole output as one string. With max_bytes, lines past
+        that many bytes (of decoded text) are read and dropped, and a
+        marker line says how many.
+        """
+        lines, size, dropped = [], 0, 0
+        for line in self:
+            if max_bytes is not None and size + len(line) + 1 > max_bytes:
+                dropped += 1
+                continue
+            lines.append(line)
+            size += len(line) + 1
+        if dropped:
+            lines.append(truncation_marker("Output", max_bytes, dropped))
+            self.trailing_newline = True
+        return "\n".join(lines) + ("\n" if self.trailing_newline and lines else "")
+
+    def close(self):
+        """
+        Reap the command, killing it first if its output was not read to
+        the end.
+        """
+        if self.returncode is not None:
+            return
+        if not self._eof and self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.stdout.close()
+        self.returncode = self._proc.wait()
+        if self._timer:
+            self._timer.cancel()
+        if self._stderr_reader:
+            self._stderr_reader.join()
+            self._proc.stderr.close()
+            self.stderr = self._stderr_tail.decode("utf-8", errors="replace")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def truncation_marker(what, max_bytes, dropped_lines):
+    """
+    The line that stands in for output cut at max_bytes. It starts with a
+    backslash, like git's "\\ No newline at end of file", so patch readers
+    skip it.
+    """
+    return f"\\ {what} truncated after {max_bytes} bytes; {dropped_lines} more lines not shown"
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from git_ai_review.profiler import span
+
+# The umask can only be read by setting it, and it is process-wide, so read
+# it once here rather than while other threads may be creating files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class ReviewWriter:
+    """
+    Write a review section by section as it is produced.
+
+    Sections are separated by a newline, exactly like "\\n".join(parts).
+    A file target is written to a temporary file in the same directory and
+    renamed into place on commit(), so readers never see a half-written
+    review; "-" streams straight to stdout, and an open binary stream (e.g.
+    a socket file) is written to directly.
+    """
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.offset = 0
+        self._started = False
+        self._tmp = None
+        if out_file == "-":
+            self._fh = sys.stdout.buffer
+        elif hasattr(out_file, "write"):
+            self._fh = out_file
+        else:
+            target = Path(out_file)
+            fd, self._tmp = tempfile.mkstemp(
+                dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+            )
+            self._fh = os.fdopen(fd, "wb")
+
+    @property
+    def to_stdout(self):
+        return self._tmp is None
+
+    def write(self, text):
+        """
+        Append one section and return its (offset, length) in bytes.
+        """
+        data = text.encode("utf-8")
+        with span("write", "write", bytes_out=len(data)):
+            if self._started:
+                self._fh.write(b"\n")
+                self.offset += 1
+            self._started = True
+            start = self.offset
+            self._fh.write(data)
+            self.offset += len(data)
+            if self.to_stdout:
+                self._fh.flush()
+        return start, len(data)
+
+    def commit(self):
+        self._fh.flush()
+        if self._tmp is not None:
+            self._fh.close()
+            # mkstemp creates 0600 files; give the review the usual umask mode
+            os.chmod(self._tmp, 0o666 & ~_UMASK)
+            os.replace(self._tmp, self.out_file)
+            self._tmp = None
+
+    def abort(self):
+        if self._tmp is not None:
+            self._fh.close()
+            try:
+                os.unlink(self._tmp)
+            except OSError:
+                pass
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()